@@ -0,0 +1,303 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+#!/usr/bin/env python3
+
+""" Benchmarks for the D20 Character Generator.
+
+Times every generation stage, generate() at levels 1, 10 and 20, the
+command line end to end with output sent to /dev/null, and the imports
+done at startup. Results are saved
+as JSON, and can be compared against a stored baseline to catch
+regressions.
+
+Usage: python bench_char_gen.py [--output FILE] [--baseline FILE]
+                                [--tolerance T] [--sizes N,...] [--repeat R]
+                                [--import-budget MS]
+
+Optional arguments:
+    --output FILE    Save results as JSON to FILE
+    --baseline FILE  Compare results against a JSON file saved by --output
+                     and exit with status 1 if any benchmark regressed
+    --tolerance T    Allowed slowdown against the baseline, as a fraction,
+                     defaults to 0.1 (10%)
+    --sizes N,...    Character counts for the end to end runs, defaults to
+                     1,10000,1000000
+    --repeat R       Runs of each benchmark, the fastest is kept, defaults to 5
+    --import-budget MS
+                     Most milliseconds of imports allowed for starting a
+                     one character run, measured with python -X importtime;
+                     the script exits with status 1 if it is over budget or
+                     if --version loads any of the generator, defaults to 20
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+sys.path.insert(0, SRC_DIR)
+
+import char_gen  # noqa: E402
+from char_gen_rng import BufferedDice  # noqa: E402
+
+# Characters each stage benchmark runs over per repeat.
+STAGE_BATCH = 20000
+
+
+def _best(function, repeat):
+    """Run function repeat times and return the fastest wall time."""
+
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _prepared(count, lvl, stages, rng):
+    """Characters of level lvl that have been through the given stages."""
+
+    players = []
+    for i in range(count):
+        player = char_gen.Character()
+        char_gen.level(player, lvl)
+        for stage in stages:
+            stage(player, rng)
+        players.append(player)
+    return players
+
+
+def bench_stages(repeat):
+    """Time each stage function, per character, on characters prepared up to that stage."""
+
+    rng = BufferedDice(0)
+    done = [char_gen.gender, char_gen.race, char_gen.char_class, char_gen.alignment]
+    stages = [
+        ("stats", char_gen.stats),
+        ("race_stat_effects", char_gen.race_stat_effects),
+        ("level_stat_effects", char_gen.level_stat_effects),
+        ("health", char_gen.health),
+        ("languages", char_gen.languages),
+        ("proficiencies", char_gen.proficiencies),
+    ]
+
+    results = {}
+    for name, stage in stages:
+        timings = []
+        for i in range(repeat):
+            # Stages change the character, so every repeat gets fresh ones.
+            players = _prepared(STAGE_BATCH, 20, done, rng)
+            start = time.perf_counter()
+            for player in players:
+                stage(player, rng)
+            timings.append(time.perf_counter() - start)
+
+        results["stage." + name] = min(timings) / STAGE_BATCH
+        done.append(stage)
+
+    players = _prepared(STAGE_BATCH, 20, done, rng)
+
+    def run():
+        for player in players:
+            char_gen.print_char(player)
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        results["stage.print_char"] = _best(run, repeat) / STAGE_BATCH
+
+    return results
+
+
+def bench_generate(repeat):
+    """Time generate() per character at levels 1, 10 and 20."""
+
+    rng = BufferedDice(0)
+    results = {}
+
+    for lvl in (1, 10, 20):
+        def run():
+            for i in range(STAGE_BATCH):
+                char_gen.generate(lvl, rng)
+
+        results["generate.level_{0}".format(lvl)] = _best(run, repeat) / STAGE_BATCH
+
+    return results
+
+
+def bench_cli(sizes, repeat):
+    """Time the command line end to end for each size, with output sent to /dev/null."""
+
+    script = os.path.join(SRC_DIR, "char_gen.py")
+    results = {}
+
+    for size in sizes:
+        def run():
+            subprocess.run([sys.executable, script, "-{0}".format(size), "--seed", "0"],
+                           stdout=subprocess.DEVNULL, check=True)
+
+        # The largest runs take a long time, so they are only run once.
+        runs = repeat if size <= 10000 else 1
+        results["cli.n_{0}".format(size)] = _best(run, runs)
+
+    return results
+
+
+def _import_time(args):
+    """Total seconds python -X importtime reports for top level imports, and their names.
+
+    Bytecode caching is turned on and the command is run once beforehand,
+    so the timing is of a normal, already compiled install.
+    """
+
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    command = [sys.executable, "-X", "importtime"] + args
+
+    subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=True)
+    report = subprocess.run(command, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=True).stderr
+
+    total = 0
+    modules = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        if not name[1:].startswith(" "):  # Nested imports are indented
+            total += int(cumulative)
+
+    return total / 1e6, modules
+
+
+def bench_startup(repeat):
+    """Time the imports done by --version and by a one character run.
+
+    The time python itself spends importing before running anything is
+    taken off, leaving what the generator adds. The modules --version
+    imported are returned as well.
+    """
+
+    script = os.path.join(SRC_DIR, "char_gen.py")
+    runs = {
+        "startup.imports_version": [script, "--version"],
+        "startup.imports_n_1": [script, "-1", "--seed", "0"]
+    }
+
+    results = {}
+    version_modules = []
+    for name, args in runs.items():
+        timings = []
+        for i in range(repeat):
+            interpreter = _import_time(["-c", "pass"])[0]
+            seconds, modules = _import_time(args)
+            timings.append(max(seconds - interpreter, 0.0))
+            if name == "startup.imports_version":
+                version_modules = modules
+        results[name] = min(timings)
+
+    return results, version_modules
+
+
+# Results left out of the baseline comparison. The --version import time is
+# almost all interpreter noise; the --version module check covers it.
+ungated = frozenset({"startup.imports_version"})
+
+
+def compare(results, baseline, tolerance):
+    """Return the benchmarks in results that are slower than baseline by more than tolerance.
+
+    Results in ungated are skipped, as are baseline entries of 0 or less,
+    which can't be compared against.
+    """
+
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        before = baseline.get(name, 0.0)
+        if name not in ungated and before > 0 and seconds > before * (1 + tolerance):
+            regressions.append((name, before, seconds))
+    return regressions
+
+
+def main():
+    """Run the benchmarks, save them and compare them to a baseline."""
+
+    parser = argparse.ArgumentParser(description="Benchmarks for the D20 Character Generator.")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--sizes", default="1,10000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=20.0)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    results = {}
+    results.update(bench_stages(args.repeat))
+    results.update(bench_generate(args.repeat))
+    results.update(bench_cli(sizes, args.repeat))
+    startup, version_modules = bench_startup(args.repeat)
+    results.update(startup)
+
+    for name, seconds in sorted(results.items()):
+        print("{0:<30} {1:>12.3f} us".format(name, seconds * 1e6))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "version": char_gen.__version__,
+                "results": results
+            }, output, indent=2)
+
+    failed = False
+
+    generator_modules = [name for name in version_modules if name.startswith("char_gen_")]
+    if generator_modules:
+        print("STARTUP --version imported {0}".format(", ".join(generator_modules)))
+        failed = True
+    if results["startup.imports_n_1"] * 1000 > args.import_budget:
+        print("STARTUP imports took {0:.1f} ms, over the {1:.1f} ms budget".format(
+            results["startup.imports_n_1"] * 1000, args.import_budget))
+        failed = True
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print("REGRESSION {0}: {1:.3f} us -> {2:.3f} us ({3:+.1%})".format(
+                name, before * 1e6, after * 1e6, after / before - 1))
+        if regressions:
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,84 +21,284 @@
 
 A program to generate randomized characters for D20 systems.
 
-Usage: python char_gen.py [--version] [--help] [-N] [-L]
+Usage: python char_gen.py [--version] [--help] [-N] [-L] [--workers K]
+                          [--chunk-size C] [--format F] [--schema] [--seed S]
+                          [--average-hp] [--profile] [--pstats FILE]
+                          [--race LIST] [--class LIST] [--alignment LIST]
+                          [--min-stat LIST] [--analyze] [--check N] [--index I]
+                          [--sweep] [--sqlite PATH]
 
 Optional arguments:
     -h, --help     Show this help message and exit
     --version      Show the program version and exit
     -N             Generate N number of characters, defaults to 1 if not specified
     -L             Generate a character of level L, defaults to 1 if not specified
+    --workers K    Generate characters across K worker processes, defaults to 1
+    --chunk-size C Characters per unit of work sent to a worker, defaults to 1000
+    --format F     Output format: text, jsonl, csv, msgpack or store, defaults to text
+    --schema       Start jsonl, csv or msgpack output with a schema or header
+    --seed S       Seed the run with integer S so its output can be reproduced
+    --average-hp   Use the average of the hit die for HP above level 1 instead of rolls
+    --profile      Print a per-stage time and dice drawn breakdown to stderr afterwards
+    --pstats FILE  Run under cProfile and save the pstats data to FILE
+    --race LIST    Only generate the comma separated races, e.g. elf,dwarf
+    --class LIST   Only generate the comma separated classes, e.g. wizard
+    --alignment LIST
+                   Only generate the comma separated alignments. A word such
+                   as evil picks every alignment containing it, and a '!' in
+                   front of a name in any of these lists excludes it, e.g. '!evil'
+    --min-stat LIST
+                   Minimum final stat scores, counting racial bonuses and ASIs,
+                   e.g. INT=16,DEX=14
+    --analyze      Print the exact distributions of stats, HP and proficiencies
+                   at level L for each --race and --class instead of characters
+    --check N      With --analyze, also compare against N generated characters
+    --index I      Generate characters I to I+N-1 of the set seeded with --seed,
+                   each rebuilt from the seed and its index alone
+    --sweep        Write each character at every level from L to 20, all from
+                   the same base rolls
+    --sqlite PATH  Load the characters into the SQLite database at PATH, inserting
+                   --chunk-size characters per transaction, instead of printing them
 """
 
 __author__ = "Quinn Luetzow"
 __version__ = 3.0
 
 import sys
-from random import randint
-from string import capwords
 
-from char_gen_components import (
-    Alignment, Language, Size, Stat, BaseClass, Race, race_traits, race_proficiencies,
-    ToolProficiencies, class_proficiencies, class_proficiency_choices
+
+def _print_info(args):
+    """Answer --version and --help, which exit without generating anything."""
+
+    if len(args) >= 1:
+        if args[0] == "--version":
+            print("D20 Character Generator version {0}".format(__version__))
+            sys.exit(0)
+        elif args[0] == "--help" or args[0] == "-h":
+            print(__doc__)
+            sys.exit(0)
+
+
+# Handled before the generator is imported, so they start as fast as possible.
+if __name__ == "__main__":
+    _print_info(sys.argv[1:])
+
+
+from collections.abc import MutableSet  # noqa: E402
+from io import BytesIO  # noqa: E402
+
+from char_gen_components import (  # noqa: E402
+    Alignment, Stat, BaseClass, Race, race_traits, base_proficiency_masks, language_bits,
+    language_members, proficiency_bits, proficiency_members, race_rules, class_hit_dice,
+    hit_dice_names, asi_points, class_skill_counts, class_skill_pools,
+    class_tool_choices
 )
+from char_gen_output import render_char, writers  # noqa: E402
+from char_gen_rng import BufferedDice, CounterDice, default_rng, derive_seed  # noqa: E402
+
+
+class StatBlock:
+    """Mapping view of a character's stats, stored as one byte per Stat."""
+
+    __slots__ = ("_scores",)
+
+    def __init__(self, scores):
+        self._scores = scores
+
+    def __getitem__(self, stat):
+        return self._scores[stat.value]
+
+    def __setitem__(self, stat, value):
+        self._scores[stat.value] = value
+
+    def __iter__(self):
+        return iter(Stat)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def keys(self):
+        return iter(Stat)
+
+    def values(self):
+        return iter(self._scores)
+
+    def items(self):
+        return zip(Stat, self._scores)
+
+
+class EnumSet(MutableSet):
+    """Set view of enum members stored as an integer bitmask on a character.
+
+    If base_attr is given, the set is the union of that attribute's mask,
+    which may be shared between many characters, and the character's own
+    mask in attr. Additions only touch attr; removing a member of the base
+    first copies the base into attr.
+    """
+
+    __slots__ = ("_owner", "_attr", "_members", "_bits", "_base_attr")
+
+    def __init__(self, owner, attr, members, bits, base_attr=None):
+        self._owner = owner
+        self._attr = attr
+        self._members = members
+        self._bits = bits
+        self._base_attr = base_attr
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    @property
+    def mask(self):
+        """The bitmask of every member in the set."""
+
+        mask = getattr(self._owner, self._attr)
+        if self._base_attr:
+            mask |= getattr(self._owner, self._base_attr)
+        return mask
+
+    def __contains__(self, member):
+        return bool(self.mask & self._bits.get(member, 0))
+
+    def __iter__(self):
+        mask = self.mask
+        members = self._members
+        while mask:
+            low = mask & -mask
+            yield members[low.bit_length() - 1]
+            mask ^= low
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def add(self, member):
+        setattr(self._owner, self._attr, getattr(self._owner, self._attr) | self._bits[member])
+
+    def discard(self, member):
+        bit = self._bits.get(member, 0)
+        if self._base_attr and getattr(self._owner, self._base_attr) & bit:
+            setattr(self._owner, self._attr, self.mask & ~bit)
+            setattr(self._owner, self._base_attr, 0)
+        else:
+            setattr(self._owner, self._attr, getattr(self._owner, self._attr) & ~bit)
+
+
+def _to_mask(members, bits):
+    """Convert an iterable of enum members, or an existing mask, to a bitmask."""
+
+    if isinstance(members, int):
+        return members
+
+    mask = 0
+    for member in members:
+        mask |= bits[member]
+    return mask
 
 
 class Character:
-    """Class representing a character"""
+    """Class representing a character.
+
+    Stats are kept in a 6-byte array indexed by Stat.value, and languages and
+    proficiencies as integer bitmasks over the enums in char_gen_components.
+    The stats, languages and proficiencies attributes give dict and set style
+    access on top of that storage. Traits reference the shared per-race list,
+    and proficiencies are split into the shared race and class base mask
+    and the character's own random additions.
+    """
+
+    __slots__ = (
+        "gender", "race", "traits", "char_class", "alignment", "level", "health",
+        "hit_dice", "speed", "size", "_stats", "_languages", "_proficiency_base",
+        "_proficiencies"
+    )
 
     def __init__(self):
         self.gender = None
         self.race = None
-        self.traits = []
+        self.traits = ()
         self.char_class = None
         self.alignment = None
-        self.stats = {
-            Stat.STRENGTH: 0, Stat.DEXTERITY: 0, Stat.CONSTITUTION: 0,
-            Stat.INTELLIGENCE: 0, Stat.WISDOM: 0, Stat.CHARISMA: 0
-        }
+        self._stats = bytearray(len(Stat))
         self.level = 0
         self.health = 0
         self.hit_dice = None
         self.speed = None
         self.size = None
-        self.languages = set()
-        self.proficiencies = set()
+        self._languages = 0
+        self._proficiency_base = 0
+        self._proficiencies = 0
+
+    @property
+    def stats(self):
+        return StatBlock(self._stats)
+
+    @stats.setter
+    def stats(self, values):
+        for stat, score in values.items():
+            self._stats[stat.value] = score
+
+    @property
+    def languages(self):
+        return EnumSet(self, "_languages", language_members, language_bits)
+
+    @languages.setter
+    def languages(self, members):
+        self._languages = _to_mask(members, language_bits)
+
+    @property
+    def proficiencies(self):
+        return EnumSet(self, "_proficiencies", proficiency_members, proficiency_bits,
+                       "_proficiency_base")
+
+    @proficiencies.setter
+    def proficiencies(self, members):
+        self._proficiency_base = 0
+        self._proficiencies = _to_mask(members, proficiency_bits)
+
+    def copy(self):
+        """Copy of the character that can be changed without affecting this one."""
+
+        other = Character.__new__(Character)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        other._stats = bytearray(self._stats)
+        return other
 
 
-def gender(player):
+def gender(player, rng=default_rng):
     """Randomly determine the gender of the character being created"""
 
-    gen = randint(1, 100)  # 0-49 results in male, 50-99 results in female
+    gen = rng.randint(1, 100)  # 0-49 results in male, 50-99 results in female
 
     player.gender = True if gen >= 50 else False
 
 
-def race(player):
+def race(player, rng=default_rng):
     """Randomly determine the race of the character being created"""
 
-    player.race = Race(randint(0, 8))
+    player.race = Race(rng.randint(0, 8))
 
 
-def char_class(player):
+def char_class(player, rng=default_rng):
     """Randomly determine the class of the character being created"""
 
-    player.char_class = BaseClass(randint(0, 11))
+    player.char_class = BaseClass(rng.randint(0, 11))
 
 
-def stats(player):
+def stats(player, rng=default_rng):
     """Randomly assign initial stat values to the character being created"""
 
-    for key, val in player.stats.items():
-        # Using the 4d6 drop lowest method
-        rolls = [randint(1, 6), randint(1, 6), randint(1, 6), randint(1, 6)]
-        rolls.remove(min(rolls))
-        player.stats[key] = sum(rolls)
+    # Using the 4d6 drop lowest method, sampled from its exact distribution.
+    scores = player.stats
+    for stat, score in zip(Stat, rng.ability_scores(len(Stat))):
+        scores[stat] = score
 
 
-def alignment(player):
+def alignment(player, rng=default_rng):
     """Randomly determine alignment of the character being created"""
 
-    player.alignment = Alignment(randint(0, 8))
+    player.alignment = Alignment(rng.randint(0, 8))
 
 
 def level(player, lvl):
@@ -113,357 +313,546 @@ def traits(player):
     player.traits = race_traits[player.race]
 
 
-def languages(player):
+def languages(player, rng=default_rng):
     """Assign racial and extra languages to the character being created"""
 
-    player.languages.add(Language(0))  # All characters speak Common
-
-    if player.race is Race.HUMAN:
-        player.languages.add(Language(randint(1, 7)))
-    elif player.race is Race.ELF:
-        player.languages.add(Language.ELVISH)
-    elif player.race is Race.DWARF:
-        player.languages.add(Language.DWARVISH)
-    elif player.race is Race.GNOME:
-        player.languages.add(Language.GNOMISH)
-    elif player.race is Race.HALFLING:
-        player.languages.add(Language.HALFLING)
-    elif player.race is Race.HALF_ELF:
-        player.languages.add(Language.ELVISH)
-        player.languages.add(Language(randint(2, 7)))
-    elif player.race is Race.HALF_ORC:
-        player.languages.add(Language.ORC)
-    elif player.race is Race.DRAGONBORN:
-        player.languages.add(Language.DRACONIC)
-    elif player.race is Race.TIEFLING:
-        player.languages.add(Language.INFERNAL)
-
-
-def health(player):
-    """Assign character's class-based health points and hit dice"""
-
-    d6_hitdice = {BaseClass.SORCERER, BaseClass.WIZARD}
-    d8_hitdice = {BaseClass.BARD, BaseClass.CLERIC, BaseClass.DRUID, BaseClass.MONK,
-                  BaseClass.ROGUE, BaseClass.WARLOCK}
-    d10_hitdice = {BaseClass.FIGHTER, BaseClass.PALADIN, BaseClass.RANGER}
-
-    d12_hitdice = {BaseClass.BARBARIAN}
-
-    if player.char_class in d8_hitdice:
-        player.health = 8 + player.stats[Stat.CONSTITUTION]
-        player.hit_dice = "1d8"
-        if player.level > 1:
-            for i in range(2, player.level):
-                player.health += randint(1, 8) + player.stats[Stat.CONSTITUTION]
-
-    elif player.char_class in d10_hitdice:
-        player.health = 10 + player.stats[Stat.CONSTITUTION]
-        player.hit_dice = "1d10"
-        if player.level > 1:
-            for i in range(2, player.level):
-                player.health += randint(1, 10) + player.stats[Stat.CONSTITUTION]
-
-    elif player.char_class in d6_hitdice:
-        player.health = 6 + player.stats[Stat.CONSTITUTION]
-        player.hit_dice = "1d6"
-        if player.level > 1:
-            for i in range(2, player.level):
-                player.health += randint(1, 6) + player.stats[Stat.CONSTITUTION]
-
-    elif player.char_class in d12_hitdice:
-        player.health = 12 + player.stats[Stat.CONSTITUTION]
-        player.hit_dice = "1d12"
-        if player.level > 1:
-            for i in range(2, player.level):
-                player.health += randint(1, 12) + player.stats[Stat.CONSTITUTION]
-
-
-def race_stat_effects(player):
-    """Apply racial stat bonuses to the character being created"""
-
-    player.speed = 30  # "Default" or most common speed and size, here to avoid repetition
-    player.size = Size.MEDIUM
-
-    match player.race:
-        case Race.HUMAN:
-            for key, val in player.stats.items():
-                player.stats[key] += 1
-        case Race.ELF:
-            player.stats[Stat.DEXTERITY] += 2
-        case Race.DWARF:
-            player.stats[Stat.CONSTITUTION] += 2
-            player.speed = 25
-        case Race.GNOME:
-            player.stats[Stat.INTELLIGENCE] += 2
-            player.size = Size.SMALL
-            player.speed = 25
-        case Race.HALFLING:
-            player.stats[Stat.DEXTERITY] += 2
-            player.size = Size.SMALL
-            player.speed = 25
-        case Race.HALF_ELF:
-            player.stats[Stat.CHARISMA] += 2
-
-            rand_stat1 = randint(0, 5)  # Pick two random stats to give bonus to
-            rand_stat2 = randint(0, 5)
-
-            match rand_stat1:
-                case 0:
-                    player.stats[Stat.STRENGTH] += 1
-                case 1:
-                    player.stats[Stat.DEXTERITY] += 1
-                case 2:
-                    player.stats[Stat.CONSTITUTION] += 1
-                case 3:
-                    player.stats[Stat.INTELLIGENCE] += 1
-                case 4:
-                    player.stats[Stat.WISDOM] += 1
-                case 5:
-                    player.stats[Stat.CHARISMA] += 1
-
-            match rand_stat2:
-                case 0:
-                    player.stats[Stat.STRENGTH] += 1
-                case 1:
-                    player.stats[Stat.DEXTERITY] += 1
-                case 2:
-                    player.stats[Stat.CONSTITUTION] += 1
-                case 3:
-                    player.stats[Stat.INTELLIGENCE] += 1
-                case 4:
-                    player.stats[Stat.WISDOM] += 1
-                case 5:
-                    player.stats[Stat.CHARISMA] += 1
-
-        case Race.HALF_ORC:
-            player.stats[Stat.CONSTITUTION] += 2
-            player.stats[Stat.STRENGTH] += 1
-        case Race.DRAGONBORN:
-            player.stats[Stat.STRENGTH] += 2
-            player.stats[Stat.CONSTITUTION] += 1
-        case Race.TIEFLING:
-            player.stats[Stat.CHARISMA] += 2
-            player.stats[Stat.INTELLIGENCE] += 1
-
-    # Make sure no stats are over 20 (max value) from racial bonuses
-    for key, val in player.stats.items():
-        if player.stats[key] > 20:
-            player.stats[key] = 20
-
-
-def level_stat_effects(player):
+    rule = race_rules[player.race]
+
+    player.languages = rule.languages  # Includes Common, which all characters speak
+    if rule.language_choices:
+        choices = rule.language_choices
+        player.languages.add(choices[rng.randint(0, len(choices) - 1)])
+
+
+def health(player, rng=default_rng, average=False):
+    """Assign character's class-based health points and hit dice
+
+    The first level gets the full hit die and every later level one roll of
+    it, all rolled together. With average set, later levels get the fixed
+    average of the die (half its sides plus one) instead of a roll.
+    """
+
+    die = class_hit_dice[player.char_class]
+    constitution = player.stats[Stat.CONSTITUTION]
+    extra_levels = max(player.level - 1, 0)
+
+    if average:
+        rolled = extra_levels * (die // 2 + 1)
+    else:
+        rolled = rng.roll(die, extra_levels)
+
+    player.hit_dice = hit_dice_names[die]
+    player.health = die + constitution * (1 + extra_levels) + rolled
+
+
+def race_stat_effects(player, rng=default_rng, random_bonuses=True):
+    """Apply racial stat bonuses to the character being created
+
+    With random_bonuses off, the race's random +1s are already in the
+    initial stats, as char_gen_constraints places them, and only the fixed
+    bonuses are added.
+    """
+
+    rule = race_rules[player.race]
+
+    player.speed = rule.speed
+    player.size = rule.size
+
+    scores = player._stats
+    for _ in range(rule.stat_choices if random_bonuses else 0):
+        scores[rng.randint(0, 5)] += 1  # Bonus to a random stat
+
+    # Add the bonuses, making sure no stats are over 20 (max value).
+    scores[:] = bytes(min(score + bonus, 20) for score, bonus in zip(scores, rule.stat_bonus))
+
+
+def allocate_asi(scores, points, rng=default_rng):
+    """Spend ASI points one at a time on random stats that are below 20.
+
+    scores is a mutable sequence of stat values indexed by Stat.value. The
+    stats still below 20 are kept in a list and every point is drawn
+    straight from it, so each point costs exactly one roll. Once every
+    stat is at 20 the remaining points can't be spent. Returns the number
+    of points left unspent.
+    """
+
+    eligible = [stat for stat, score in enumerate(scores) if score < 20]
+
+    for spent in range(points):
+        if not eligible:
+            return points - spent
+
+        pick = rng.randint(0, len(eligible) - 1)
+        stat = eligible[pick]
+        scores[stat] += 1
+
+        if scores[stat] >= 20:
+            # Swap the maxed stat out of the list instead of shifting it.
+            eligible[pick] = eligible[-1]
+            eligible.pop()
+
+    return 0
+
+
+def level_stat_effects(player, rng=default_rng):
     """Assign ASI stat bumps to the character being created."""
 
-    disallowed_stats = set()  # Stats that are maxed out at 20 already
-
-    for stat in player.stats:
-        if stat.value == 20:
-            disallowed_stats.add(stat)
-
-    # Milestone levels each class gets ASI at. Fighters get extra,
-    # so will be processed separately.
-    basic_asi_milestones = {4, 8, 12, 16, 19}
-    fighter_asi_milestones = {4, 6, 8, 12, 14, 16, 19}
-
-    def select_stat(disallowed):
-        stat_1 = None
-        stat_2 = None
-
-        # Loop until valid stats are chosen
-        while (stat_1 in disallowed or not stat_1 and
-               stat_2 in disallowed or not stat_2):
-            stat_1 = Stat(randint(0, 5))
-            stat_2 = Stat(randint(0, 5))
-
-        return stat_1, stat_2
-
-    # Fighters get extra ASI bonuses, so run separately.
-    if player.char_class == BaseClass.FIGHTER:
-        for milestone_level in fighter_asi_milestones:  # Loop for each ASI
-            if player.level >= milestone_level:
-                # Select stat and increment by 1
-                stat1, stat2 = select_stat(disallowed_stats)
-                player.stats[stat1] += 1
-                player.stats[stat2] += 1
-
-                # To avoid going above 20 in any stat, if at 20 after this
-                # round of bumps, add to disallowed stats.
-                if player.stats[stat1] == 20:
-                    disallowed_stats.add(stat1)
-                if player.stats[stat2] == 20:
-                    disallowed_stats.add(stat2)
-
-    # All other class get the same number of ASI bonuses, so share logic.
+    allocate_asi(player._stats, asi_points(player.char_class, player.level), rng)
+
+
+def level_up(player, to_level, rng=default_rng, average=False):
+    """Raise an existing character to level to_level, keeping its rolls.
+
+    Only the ASI points earned between the old and new level are spent,
+    and only the hit dice for the new levels are rolled, so the cost grows
+    with the number of levels gained. Hit points are also brought in line
+    with any Constitution gained, as health() would give at to_level.
+    """
+
+    if to_level < player.level:
+        raise ValueError("Can't level a character down from {0} to {1}".format(
+            player.level, to_level))
+
+    old_level = player.level
+    old_constitution = player.stats[Stat.CONSTITUTION]
+
+    allocate_asi(player._stats, asi_points(player.char_class, to_level)
+                 - asi_points(player.char_class, old_level), rng)
+
+    die = class_hit_dice[player.char_class]
+    new_levels = max(to_level - 1, 0) - max(old_level - 1, 0)
+    if average:
+        rolled = new_levels * (die // 2 + 1)
     else:
-        for milestone_level in basic_asi_milestones:  # Loop for each ASI.
-            if player.level >= milestone_level:
-                # Select stat and increment by 1.
-                stat1, stat2 = select_stat(disallowed_stats)
-                player.stats[stat1] += 1
-                player.stats[stat2] += 1
-
-                # To avoid going above 20 in any stat, if at 20 after this
-                # round of bumps, add to disallowed stats.
-                if player.stats[stat1] == 20:
-                    disallowed_stats.add(stat1)
-                if player.stats[stat2] == 20:
-                    disallowed_stats.add(stat2)
-
-
-def proficiencies(player):
-    """Assign proficiencies to the character being created."""
+        rolled = rng.roll(die, new_levels)
 
-    # Cutoff point for gaming set proficiencies, needed for monk.
-    game_set_cutoff = 32
+    constitution = player.stats[Stat.CONSTITUTION]
+    player.health += (constitution * max(to_level, 1) - old_constitution * max(old_level, 1)
+                      + rolled)
+    player.level = to_level
 
-    # Cutoff points for instrument proficiencies, needed for bard.
-    instrument_start_cutoff = 19
-    instrument_end_cutoff = 28
 
-    # How many random proficiencies.
-    choose2 = {
-        BaseClass.BARBARIAN, BaseClass.CLERIC, BaseClass.DRUID,
-        BaseClass.FIGHTER, BaseClass.PALADIN, BaseClass.SORCERER,
-        BaseClass.WARLOCK, BaseClass.WIZARD, BaseClass.MONK
-    }
-    choose3 = {BaseClass.BARD, BaseClass.RANGER}
-    choose4 = {BaseClass.ROGUE}
-
-    # Monk can also choose from anything except game sets.
-    monk_opt = [ToolProficiencies(x) for x in range(game_set_cutoff)]
-
-    # Bard can choose from random instruments.
-    bard_opt = [
-        ToolProficiencies(x) for x in range(instrument_start_cutoff,
-                                            instrument_end_cutoff)
-    ]
-
-    def select_proficiency(amount):
-        """Select the random proficiencies for the character"""
-
-        options_list = list(class_proficiency_choices[player.char_class])
-
-        # range() starts at 0, so subtract 1 to get the right number of selections.
-        for i in range(amount - 1):
-            while True:
-                selection = options_list[randint(0, len(options_list) - 1)]
-                if selection not in player.proficiencies:
-                    player.proficiencies.add(selection)
-                    break
-
-        # Add random extra proficiencies for Monk and Bard.
-        if player.char_class is BaseClass.MONK:
-            player.proficiencies.add(monk_opt[randint(0, len(monk_opt) - 1)])
-        elif player.char_class is BaseClass.BARD:
-            instruments = 3
-            while instruments > 0:
-                selection = bard_opt[randint(0, len(bard_opt) - 1)]
-                if selection not in player.proficiencies:
-                    player.proficiencies.add(selection)
-                    instruments -= 1
-                else:
-                    continue
+def proficiencies(player, rng=default_rng):
+    """Assign proficiencies to the character being created."""
 
-    # Combine racial and class proficiencies together.
-    player.proficiencies = race_proficiencies[player.race]
-    player.proficiencies = player.proficiencies.union(class_proficiencies[player.char_class])
+    # Racial and class proficiencies combined, shared by every character
+    # of the same race and class.
+    player._proficiency_base = base_proficiency_masks[player.race, player.char_class]
+    player._proficiencies = 0
+    owned = player.proficiencies
 
-    # Select random proficiencies for class that get them.
-    if player.char_class in choose2:
-        select_proficiency(2)
-    elif player.char_class in choose3:
-        select_proficiency(3)
-    elif player.char_class in choose4:
-        select_proficiency(4)
+    # Select random skills for the class, skipping any already known.
+    for skill in rng.draw_distinct(class_skill_pools[player.char_class],
+                                   class_skill_counts[player.char_class], owned):
+        owned.add(skill)
+
+    # Add random extra tool proficiencies for Monk and Bard.
+    if player.char_class in class_tool_choices:
+        pool, amount = class_tool_choices[player.char_class]
+        for tool in rng.draw_distinct(pool, amount, owned):
+            owned.add(tool)
 
 
 def print_char(character):
     """Output each attribute of the created character to the console."""
 
-    print("Gender: {0}".format("Female" if character.gender else "Male"))
-    print("Race: {0}".format(character.race.name.capitalize()))
-    print("Size: {0}".format(character.size.name.capitalize()))
-    print("Walk speed: {0} feet".format(character.speed))
+    print(render_char(character), end="")
+
+
+# The stages generate() runs, in the same order, as (name, function) pairs
+# taking (player, lvl, rng, average_hp). Only used while a profiler is set.
+generation_stages = (
+    ("gender", lambda player, lvl, rng, average_hp: gender(player, rng)),
+    ("race", lambda player, lvl, rng, average_hp: race(player, rng)),
+    ("char_class", lambda player, lvl, rng, average_hp: char_class(player, rng)),
+    ("alignment", lambda player, lvl, rng, average_hp: alignment(player, rng)),
+    ("stats", lambda player, lvl, rng, average_hp: stats(player, rng)),
+    ("level", lambda player, lvl, rng, average_hp: level(player, lvl)),
+    ("race_stat_effects", lambda player, lvl, rng, average_hp: race_stat_effects(player, rng)),
+    ("level_stat_effects",
+     lambda player, lvl, rng, average_hp: level_stat_effects(player, rng)),
+    ("health", lambda player, lvl, rng, average_hp: health(player, rng, average_hp)),
+    ("languages", lambda player, lvl, rng, average_hp: languages(player, rng)),
+    ("traits", lambda player, lvl, rng, average_hp: traits(player)),
+    ("proficiencies", lambda player, lvl, rng, average_hp: proficiencies(player, rng)),
+)
 
-    print("Racial Traits: {0}".format(
-        capwords(", ".join(x.name for x in character.traits).replace("_", " ")))
-    )
+_profiler = None
 
-    print("Class: {0}".format(character.char_class.name.capitalize()))
-    print("Level: {0}".format(character.level))
-    print("HP: {0}".format(character.health))
-    print("Hit Dice: {0}".format(character.hit_dice))
 
-    print("Alignment: {0}".format(
-        capwords(
-            character.alignment.name.replace("_", " "))
-    )
-    )
+def set_profiler(profiler):
+    """Route generate() through profiler's run(), or back to direct calls with None."""
 
-    for key, val in character.stats.items():
-        print("{0}: {1}".format(key.name.lower().capitalize(), character.stats[key]))
+    global _profiler
+    _profiler = profiler
 
-    print("Languages Spoken: {0}".format(
-        capwords(", ".join(x.name for x in character.languages).replace("_", " ")))
-    )
 
-    print("Proficiencies: {0}".format(
-        capwords(", ".join(x.name for x in character.proficiencies).replace("_", " ")))
-    )
+def _constrained_stages(constraints):
+    """Copy of generation_stages drawing what constraints limits from it."""
+
+    constrained = {
+        "race": lambda player, lvl, rng, average_hp: constraints.race(player, lvl, rng),
+        "char_class":
+            lambda player, lvl, rng, average_hp: constraints.char_class(player, lvl, rng),
+        "alignment": lambda player, lvl, rng, average_hp: constraints.alignment(player, rng),
+        "stats": lambda player, lvl, rng, average_hp: constraints.stats(player, lvl, rng),
+        "race_stat_effects":
+            lambda player, lvl, rng, average_hp: race_stat_effects(player, rng, False),
+        "level_stat_effects": lambda player, lvl, rng, average_hp: allocate_asi(
+            player._stats, constraints.cover_shortfall(player, rng), rng),
+    }
+    return tuple((name, constrained.get(name, stage)) for name, stage in generation_stages)
+
 
-    print()  # Print empty line between characters
+def generate(lvl, rng=default_rng, average_hp=False, constraints=None):
+    """Workhorse function to keep main() uncluttered.
 
+    Every random choice is drawn from rng, so passing a Dice with a fixed
+    seed reproduces the same character. With average_hp set, hit points
+    above first level use the average of the hit die instead of rolls.
+    A char_gen_constraints.Constraints passed as constraints limits the
+    race, class, alignment and stats picked.
+    """
 
-def generate(lvl):
-    """Workhorse function to keep main() uncluttered."""
+    if _profiler is not None:
+        stages = generation_stages if constraints is None else _constrained_stages(constraints)
+        return _profiler.run(Character(), stages, lvl, rng, average_hp)
 
     player = Character()
 
-    gender(player)
-    race(player)
-    char_class(player)
-    alignment(player)
-    stats(player)
-    level(player, lvl)
-    race_stat_effects(player)
-    level_stat_effects(player)
-    health(player)
-    languages(player)
+    gender(player, rng)
+    if constraints is None:
+        race(player, rng)
+        char_class(player, rng)
+        alignment(player, rng)
+        stats(player, rng)
+        level(player, lvl)
+        race_stat_effects(player, rng)
+        level_stat_effects(player, rng)
+    else:
+        constraints.race(player, lvl, rng)
+        constraints.char_class(player, lvl, rng)
+        constraints.alignment(player, rng)
+        constraints.stats(player, lvl, rng)
+        level(player, lvl)
+        race_stat_effects(player, rng, False)
+        allocate_asi(player._stats, constraints.cover_shortfall(player, rng), rng)
+    health(player, rng, average_hp)
+    languages(player, rng)
     traits(player)
-    proficiencies(player)
+    proficiencies(player, rng)
 
     return player
 
 
+def generate_levels(lvl=1, to_level=20, rng=default_rng, average_hp=False, constraints=None):
+    """Generate one character and return it at every level from lvl to to_level.
+
+    The character is generated once at lvl and each following level is a
+    copy raised by one more level with level_up(), so all of them share
+    the same base rolls.
+    """
+
+    player = generate(lvl, rng, average_hp, constraints)
+    levels = [player]
+    for next_level in range(lvl + 1, to_level + 1):
+        player = player.copy()
+        level_up(player, next_level, rng, average_hp)
+        levels.append(player)
+
+    return levels
+
+
+def iter_characters(n=None, lvl=1, batch_size=None, rng=default_rng, average_hp=False,
+                    constraints=None):
+    """Lazily generate characters, forever if n is None.
+
+    Characters are only generated as the caller asks for them, so memory
+    stays bounded however many are produced. With batch_size set, lists of
+    up to batch_size characters are yielded instead of single characters.
+    Other arguments are passed on to generate().
+    """
+
+    remaining = n
+    while remaining is None or remaining > 0:
+        count = batch_size or 1
+        if remaining is not None:
+            count = min(count, remaining)
+            remaining -= count
+
+        if batch_size is None:
+            yield generate(lvl, rng, average_hp, constraints)
+        else:
+            yield [generate(lvl, rng, average_hp, constraints) for i in range(count)]
+
+
+async def aiter_characters(n=None, lvl=1, batch_size=None, rng=default_rng, average_hp=False,
+                           constraints=None):
+    """Async version of iter_characters() for asyncio consumers.
+
+    Gives control back to the event loop after every character or batch,
+    and only generates the next one when the consumer asks for it.
+    """
+
+    import asyncio
+
+    for item in iter_characters(n, lvl, batch_size, rng, average_hp, constraints):
+        yield item
+        await asyncio.sleep(0)
+
+
+def character_at(seed, index, lvl=1, average_hp=False, constraints=None):
+    """Character number index of the set of characters seeded with seed.
+
+    Every character is rebuilt from (seed, index) alone through its own
+    CounterDice stream, so any one of them can be made again directly,
+    without storing it or generating the ones before it. Other arguments
+    are passed on to generate() and must match to get the same character.
+    """
+
+    return generate(lvl, CounterDice(seed, index), average_hp, constraints)
+
+
+def characters_between(seed, start, stop, lvl=1, average_hp=False, constraints=None):
+    """Yield character_at() for every index from start up to stop.
+
+    Any range can be generated anywhere and gives the same characters, so
+    a large set can be split into ranges across processes or machines.
+    """
+
+    rng = CounterDice(seed)
+    for index in range(start, stop):
+        rng.set_stream(index)
+        yield generate(lvl, rng, average_hp, constraints)
+
+
+def parse_args(args, flags=()):
+    """Split command line arguments into -N/-L values and --option values.
+
+    Options take a value either as the next argument or after an '=', so
+    '--workers 4' and '--workers=4' are the same. Options named in flags
+    take no value and are set to True when present.
+    """
+
+    counts = []
+    options = {}
+
+    args = iter(args)
+    for arg in args:
+        if arg.startswith("--"):
+            name, separator, value = arg[2:].partition("=")
+            if name in flags:
+                value = True
+            elif not separator:
+                value = next(args, None)
+                if value is None:
+                    raise ValueError("Missing value for option: {0}".format(arg))
+            options[name] = value
+        elif arg.startswith("-") and len(counts) < 2:
+            counts.append(int(arg[1:]))  # Exclude the - on the argument
+        else:
+            raise ValueError("Invalid argument passed: {0}".format(arg))
+
+    return counts, options
+
+
+def _chunks(chars_to_generate, chunk_size, base_seed):
+    """Split a run into (seed, count) chunks, each with its own derived seed."""
+
+    for index, start in enumerate(range(0, chars_to_generate, chunk_size)):
+        yield derive_seed(base_seed, index), min(chunk_size, chars_to_generate - start)
+
+
+# Chunks of at least this many characters go through char_gen_batch, which
+# is faster per character but not worth importing for a handful of them.
+batch_threshold = 256
+
+
+def chunk_characters(count, rng, lvl=1, average_hp=False, constraints=None):
+    """The count characters of one chunk, all drawn from rng.
+
+    Large unconstrained chunks are generated by char_gen_batch in one go,
+    anything else one character at a time with generate(). Either way the
+    characters follow the same distributions.
+    """
+
+    if count >= batch_threshold and constraints is None and _profiler is None:
+        from char_gen_batch import generate_batch
+        return generate_batch(count, lvl, rng, average_hp)
+
+    return (generate(lvl, rng, average_hp, constraints) for i in range(count))
+
+
+def _generate_chunk(job):
+    """Generate and render one chunk of characters inside a worker process."""
+
+    chunk_seed, count, output_format, generate_options = job
+    rng = BufferedDice(chunk_seed)
+
+    buffer = BytesIO()
+    with writers[output_format](buffer) as writer:
+        for player in chunk_characters(count, rng, **generate_options):
+            writer.write(player)
+
+    return buffer.getvalue()
+
+
+def generate_parallel(chars_to_generate, workers, chunk_size, writer, output_format,
+                      base_seed, generate_options):
+    """Generate characters across a pool of worker processes.
+
+    The run is split into chunks of chunk_size characters. Each chunk is
+    generated from its own seed, derived from base_seed and the chunk index,
+    so its output does not depend on which worker ran it. generate_options
+    holds the keyword arguments for generate(). Rendered chunks are passed
+    to writer in chunk order.
+    """
+
+    from multiprocessing import Pool
+
+    jobs = (
+        (chunk_seed, count, output_format, generate_options)
+        for chunk_seed, count in _chunks(chars_to_generate, chunk_size, base_seed)
+    )
+
+    with Pool(workers) as pool:
+        for chunk in pool.imap(_generate_chunk, jobs):
+            writer.write_raw(chunk)
+
+
 def main():
     """Main() function for program."""
 
     chars_to_generate = 1
     lvl = 1
+    workers = 1
+    chunk_size = 1000
+    output_format = "text"
+
+    _print_info(sys.argv[1:])
+
+    try:
+        counts, options = parse_args(sys.argv[1:],
+                                     flags={"schema", "average-hp", "profile", "analyze",
+                                            "sweep"})
+
+        if len(counts) >= 1:
+            chars_to_generate = counts[0]
+        if len(counts) >= 2:
+            lvl = counts[1]
+
+        options_given = set(options)
+        workers = int(options.pop("workers", workers))
+        chunk_size = int(options.pop("chunk-size", chunk_size))
+        output_format = options.pop("format", output_format)
+        schema = options.pop("schema", False)
+        base_seed = int(options.pop("seed", default_rng.getrandbits(64)))
+        average_hp = options.pop("average-hp", False)
+        profile = options.pop("profile", False)
+        pstats_file = options.pop("pstats", None)
+        analyze = options.pop("analyze", False)
+        check = int(options.pop("check", 0))
+        start_index = options.pop("index", None)
+        sweep = options.pop("sweep", False)
+        sqlite_path = options.pop("sqlite", None)
+        constraint_options = {
+            name: options.pop(name) for name in ("race", "class", "alignment", "min-stat")
+            if name in options
+        }
 
-    if len(sys.argv) >= 2:
-        if sys.argv[1] == "--version":
-            print("D20 Character Generator version {0}".format(__version__))
-            sys.exit(0)
-        elif sys.argv[1] == "--help" or sys.argv[1] == "-h":
-            print(__doc__)
-            sys.exit(0)
-        elif sys.argv[1]:
-            chars_to_generate = int((sys.argv[1])[1:])  # Exclude the - on the argument
-
-            try:
-                lvl = int((sys.argv[2])[1:])  # Exclude the - on the argument
-            except IndexError:
-                pass  # Do nothing, use default value set above
-
+        for name in options:
+            raise ValueError("Invalid argument passed: --{0}".format(name))
+        if workers < 1 or chunk_size < 1:
+            raise ValueError("--workers and --chunk-size must be at least 1")
+        if output_format not in writers:
+            raise ValueError("Unknown output format: {0}".format(output_format))
+        if (profile or pstats_file) and workers > 1:
+            raise ValueError("--profile and --pstats can't be combined with --workers")
+        if start_index is not None and (workers > 1 or "seed" not in options_given):
+            raise ValueError("--index needs --seed and can't be combined with --workers")
+        if sqlite_path and workers > 1:
+            raise ValueError("--sqlite can't be combined with --workers")
+        if sweep and (workers > 1 or start_index is not None):
+            raise ValueError("--sweep can't be combined with --workers or --index")
+        if analyze and {"alignment", "min-stat"} & set(constraint_options):
+            raise ValueError("--analyze only takes --race and --class as limits")
+
+        constraints = None
+        if constraint_options:
+            from char_gen_constraints import Constraints, parse_members, parse_min_stats
+
+            constraints = Constraints(
+                races=parse_members(constraint_options["race"], Race)
+                if "race" in constraint_options else None,
+                classes=parse_members(constraint_options["class"], BaseClass)
+                if "class" in constraint_options else None,
+                alignments=parse_members(constraint_options["alignment"], Alignment)
+                if "alignment" in constraint_options else None,
+                min_stats=parse_min_stats(constraint_options.get("min-stat", ""))
+            )
+            if not analyze:
+                constraints.prepare(lvl)
+
+    except ValueError as error:
+        print(error)
+        print(__doc__)
+        sys.exit(1)
+
+    if analyze:
+        from char_gen_analysis import print_analysis
+        print_analysis(constraints.races if constraints else list(Race),
+                       constraints.classes if constraints else list(BaseClass),
+                       lvl, average_hp, check, BufferedDice(base_seed))
+        return
+
+    if sqlite_path:
+        from char_gen_sqlite import SqliteWriter
+        writer = SqliteWriter(sqlite_path, chunk_size)
+    elif output_format == "text":
+        writer = writers[output_format](sys.stdout.buffer)
+    else:
+        writer = writers[output_format](sys.stdout.buffer, schema=schema)
+
+    generate_options = {"lvl": lvl, "average_hp": average_hp, "constraints": constraints}
+
+    if profile:
+        from char_gen_profile import StageProfiler
+        profiler = StageProfiler()
+        set_profiler(profiler)
+    if pstats_file:
+        from cProfile import Profile
+        cprofile = Profile()
+        cprofile.enable()
+
+    with writer:
+        writer.write_header()
+        if start_index is not None:
+            start = int(start_index)
+            for player in characters_between(base_seed, start, start + chars_to_generate,
+                                             **generate_options):
+                writer.write(player)
+        elif workers > 1:
+            generate_parallel(chars_to_generate, workers, chunk_size, writer, output_format,
+                              base_seed, generate_options)
         else:
-            print("Invalid argument passed: {0}".format(sys.argv[1]))
-            print(__doc__)
-            sys.exit(1)
-
-    for i in range(chars_to_generate):
-        character = generate(lvl)
-        print_char(character)
+            # Seeded chunk by chunk like the parallel path, so a given --seed
+            # produces the same output whatever the number of workers.
+            for chunk_seed, count in _chunks(chars_to_generate, chunk_size, base_seed):
+                rng = BufferedDice(chunk_seed)
+                if sweep:
+                    for i in range(count):
+                        for player in generate_levels(to_level=20, rng=rng, **generate_options):
+                            writer.write(player)
+                else:
+                    for player in chunk_characters(count, rng, **generate_options):
+                        writer.write(player)
+
+    if pstats_file:
+        cprofile.disable()
+        cprofile.dump_stats(pstats_file)
+    if profile:
+        set_profiler(None)
+        print(profiler.report(), file=sys.stderr)
 
 
 if __name__ == "__main__":
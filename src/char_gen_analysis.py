@@ -0,0 +1,347 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Exact probability distributions of generated characters.
+
+For a given race, class and level, analyze() works out the distribution of
+every final stat, of hit points and the chance of having each proficiency,
+straight from the dice that stats(), race_stat_effects(),
+level_stat_effects(), health() and proficiencies() roll, without
+generating any characters. sample() builds the same tables from generated
+characters as a Monte Carlo cross-check.
+
+The stat distributions have to account for ASI points, which are spent
+one at a time on a random stat below 20, so one stat reaching 20 changes
+the odds for all the others. Picking uniformly among the stats below 20 is
+the same as picking uniformly among all six and skipping the ones at 20,
+and if those picks arrive as six independent Poisson processes, a stat
+receives its kth point exactly when the other five have taken no more
+than points - k by the time of its kth arrival. That chance is an integral
+over a gamma distributed time of terms of the form s^n * e^(-m * s),
+which has a closed form, so it is computed exactly.
+"""
+
+
+from collections import Counter, defaultdict
+from itertools import product
+from math import factorial
+
+from char_gen import asi_points
+from char_gen_components import (
+    Stat, base_proficiency_masks, class_hit_dice, class_skill_counts, class_skill_pools,
+    class_tool_choices, proficiency_members, race_rules
+)
+from char_gen_rng import ability_score_weights, default_rng
+
+
+def score_distribution(bonus):
+    """Distribution of a 4d6 drop lowest roll plus bonus, capped at 20."""
+
+    total = sum(ability_score_weights.values())
+    scores = defaultdict(float)
+    for score, weight in ability_score_weights.items():
+        scores[min(score + bonus, 20)] += weight / total
+    return dict(scores)
+
+
+def _bonus_vectors(rule):
+    """Every way the random racial +1s can land, as {bonus vector: probability}.
+
+    Each vector combines the race's fixed bonuses with one outcome of its
+    random +1s, which race_stat_effects() gives to uniformly random stats.
+    """
+
+    outcomes = list(product(range(len(Stat)), repeat=rule.stat_choices))
+    vectors = Counter()
+    for picks in outcomes:
+        bonus = list(rule.stat_bonus)
+        for stat in picks:
+            bonus[stat] += 1
+        vectors[tuple(bonus)] += 1 / len(outcomes)
+    return vectors
+
+
+def _arrival_factor(bonus, most):
+    """Terms for the points one stat takes, by the time s, out of Poisson arrivals.
+
+    A stat that is d points from 20 takes min(d, N) points from N ~
+    Poisson(s) arrivals. Returns {c: {(m, n): coefficient}} for c up to
+    most, where the chance of taking c points is the sum of coefficient *
+    e^(-m * s) * s^n.
+    """
+
+    distances = {20 - score: chance for score, chance in score_distribution(bonus).items()}
+
+    factor = {}
+    for c in range(most + 1):
+        at = distances.get(c, 0.0)
+        beyond = sum(chance for distance, chance in distances.items() if distance > c)
+
+        terms = defaultdict(float)
+        if at:
+            # Capped at c, which needs at least c arrivals.
+            terms[0, 0] += at
+            for n in range(c):
+                terms[1, n] -= at / factorial(n)
+        if beyond:
+            # Not capped yet, so exactly c arrivals.
+            terms[1, c] += beyond / factorial(c)
+        factor[c] = terms
+
+    return factor
+
+
+def _multiply(left, right, most):
+    """Combine the terms of two independent point counts, up to most points in all."""
+
+    combined = defaultdict(lambda: defaultdict(float))
+    for c1, terms1 in left.items():
+        for c2, terms2 in right.items():
+            if c1 + c2 > most:
+                continue
+            out = combined[c1 + c2]
+            for (m1, n1), x in terms1.items():
+                for (m2, n2), y in terms2.items():
+                    out[m1 + m2, n1 + n2] += x * y
+    return combined
+
+
+# _reach_chances() results, by (sorted bonuses of the other stats, points).
+_reach_cache = {}
+
+
+def _reach_chances(other_bonuses, points):
+    """Chance of a stat below 20 getting at least k of points ASI points, for every k.
+
+    Returns a list indexed by k from 0 to points + 1. The chance is the
+    same for any stat with at least k points to go before 20, as long as
+    it has that many, so only the other five stats' bonuses matter.
+    """
+
+    key = (tuple(sorted(other_bonuses)), points)
+    chances = _reach_cache.get(key)
+    if chances is not None:
+        return chances
+
+    most = points - 1
+    others = {0: {(0, 0): 1.0}}
+    for bonus in key[0]:
+        others = _multiply(others, _arrival_factor(bonus, most), most)
+
+    chances = [1.0]
+    for k in range(1, points + 1):
+        # Integrate against the gamma density of the stat's kth arrival:
+        # the integral of s^(k-1+n) e^(-(m+1)s) / (k-1)! over s >= 0.
+        chance = 0.0
+        for c in range(points - k + 1):
+            for (m, n), coefficient in others.get(c, {}).items():
+                chance += (coefficient * factorial(k - 1 + n) / factorial(k - 1)
+                           / (m + 1) ** (k + n))
+        chances.append(chance)
+    chances.append(0.0)
+
+    _reach_cache[key] = chances
+    return chances
+
+
+def stat_distributions(race, char_class, lvl):
+    """Distribution of each final stat, after racial bonuses, the cap and ASIs."""
+
+    points = asi_points(char_class, lvl)
+    distributions = {stat: defaultdict(float) for stat in Stat}
+
+    for bonus, vector_chance in _bonus_vectors(race_rules[race]).items():
+        for stat in Stat:
+            others = bonus[:stat.value] + bonus[stat.value + 1:]
+            reach = _reach_chances(others, points) if points else [1.0, 0.0]
+            out = distributions[stat]
+
+            for score, chance in score_distribution(bonus[stat.value]).items():
+                most = min(20 - score, points)
+                for k in range(most + 1):
+                    gained = reach[k] - reach[k + 1] if k < most else reach[most]
+                    out[score + k] += vector_chance * chance * gained
+
+    return {stat: dict(sorted(scores.items())) for stat, scores in distributions.items()}
+
+
+def health_distribution(race, char_class, lvl, average_hp=False, stats=None):
+    """Distribution of hit points, from the final Constitution and the hit dice.
+
+    stats can pass in stat_distributions() if it has already been worked out.
+    """
+
+    if stats is None:
+        stats = stat_distributions(race, char_class, lvl)
+
+    die = class_hit_dice[char_class]
+    extra_levels = max(lvl - 1, 0)
+
+    # Sum of the hit dice rolled for levels above the first.
+    rolled = {0: 1.0}
+    if average_hp:
+        rolled = {extra_levels * (die // 2 + 1): 1.0}
+    else:
+        for i in range(extra_levels):
+            total = defaultdict(float)
+            for value, chance in rolled.items():
+                for face in range(1, die + 1):
+                    total[value + face] += chance / die
+            rolled = total
+
+    health = defaultdict(float)
+    for constitution, con_chance in stats[Stat.CONSTITUTION].items():
+        for value, chance in rolled.items():
+            health[die + constitution * (1 + extra_levels) + value] += con_chance * chance
+
+    return dict(sorted(health.items()))
+
+
+def proficiency_chances(race, char_class):
+    """Chance of having each proficiency, for every one that is possible.
+
+    Racial and class proficiencies are certain. Each class skill or tool
+    pick is a uniform draw of distinct items from what is left of its
+    pool, so every item left has the same chance of being picked.
+    """
+
+    base = base_proficiency_masks[race, char_class]
+    chances = {
+        member: 1.0 for i, member in enumerate(proficiency_members) if base >> i & 1
+    }
+
+    picks = [(class_skill_pools[char_class], class_skill_counts[char_class])]
+    if char_class in class_tool_choices:
+        picks.append(class_tool_choices[char_class])
+
+    # The skill and tool pools don't overlap, so skill picks never take
+    # anything from the tool pool.
+    for pool, amount in picks:
+        left = [member for member in pool if member not in chances]
+        for member in left:
+            chances[member] = min(amount, len(left)) / len(left)
+
+    return chances
+
+
+def analyze(race, char_class, lvl, average_hp=False):
+    """Exact distributions of stats, hit points and proficiencies."""
+
+    stats = stat_distributions(race, char_class, lvl)
+    return {
+        "stats": stats,
+        "health": health_distribution(race, char_class, lvl, average_hp, stats),
+        "proficiencies": proficiency_chances(race, char_class)
+    }
+
+
+def sample(race, char_class, lvl, count, rng=default_rng, average_hp=False):
+    """The tables of analyze(), estimated from count generated characters."""
+
+    from char_gen import generate
+    from char_gen_constraints import Constraints
+
+    constraints = Constraints(races=[race], classes=[char_class])
+    stats = {stat: Counter() for stat in Stat}
+    health = Counter()
+    proficiencies = Counter()
+
+    for i in range(count):
+        player = generate(lvl, rng, average_hp, constraints)
+        for stat, score in player.stats.items():
+            stats[stat][score] += 1 / count
+        health[player.health] += 1 / count
+        for member in player.proficiencies:
+            proficiencies[member] += 1 / count
+
+    return {
+        "stats": {stat: dict(sorted(scores.items())) for stat, scores in stats.items()},
+        "health": dict(sorted(health.items())),
+        "proficiencies": dict(proficiencies)
+    }
+
+
+def largest_differences(exact, sampled):
+    """Largest absolute difference between two analyze() style results, per table."""
+
+    def largest(first, second):
+        return max((abs(first.get(key, 0.0) - second.get(key, 0.0))
+                    for key in set(first) | set(second)), default=0.0)
+
+    return {
+        "stats": max(largest(exact["stats"][stat], sampled["stats"][stat]) for stat in Stat),
+        "health": largest(exact["health"], sampled["health"]),
+        "proficiencies": largest(exact["proficiencies"], sampled["proficiencies"])
+    }
+
+
+def _mean(distribution):
+    return sum(value * chance for value, chance in distribution.items())
+
+
+def _percentile(distribution, fraction):
+    total = 0.0
+    for value, chance in distribution.items():
+        total += chance
+        if total >= fraction - 1e-12:
+            return value
+    return value
+
+
+def report(race, char_class, lvl, analysis):
+    """Format an analyze() result as text."""
+
+    from char_gen_components import display_names
+
+    lines = ["{0} {1}, level {2}".format(display_names[race], display_names[char_class], lvl)]
+
+    stats = analysis["stats"]
+    lines.append("Score " + "".join("{0:>9}".format(stat.name[:3].title()) for stat in Stat))
+    for score in range(3, 21):
+        lines.append("{0:>5} ".format(score) + "".join(
+            "{0:>8.3%}".format(stats[stat].get(score, 0.0)).rjust(9) for stat in Stat))
+    lines.append(" Mean " + "".join("{0:>9.3f}".format(_mean(stats[stat])) for stat in Stat))
+
+    health = analysis["health"]
+    lines.append("HP: mean {0:.2f}, min {1}, 5% {2}, median {3}, 95% {4}, max {5}".format(
+        _mean(health), min(health), _percentile(health, 0.05), _percentile(health, 0.5),
+        _percentile(health, 0.95), max(health)))
+
+    chances = analysis["proficiencies"]
+    certain = [display_names[member] for member, chance in chances.items() if chance >= 1.0]
+    lines.append("Proficiencies always had: " + ", ".join(certain))
+    lines.append("Proficiencies picked: " + ", ".join(
+        "{0} {1:.1%}".format(display_names[member], chance)
+        for member, chance in chances.items() if chance < 1.0))
+
+    return "\n".join(lines) + "\n"
+
+
+def print_analysis(races, classes, lvl, average_hp=False, check=0, rng=default_rng):
+    """Print report() for every race and class, checked against check characters each."""
+
+    for race in races:
+        for char_class in classes:
+            analysis = analyze(race, char_class, lvl, average_hp)
+            print(report(race, char_class, lvl, analysis))
+
+            if check:
+                sampled = sample(race, char_class, lvl, check, rng, average_hp)
+                print("Largest difference from {0} generated characters: {1}\n".format(
+                    check, ", ".join("{0} {1:.4%}".format(table, difference) for table, difference
+                                     in largest_differences(analysis, sampled).items())))
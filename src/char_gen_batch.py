@@ -0,0 +1,235 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Batch engine generating many characters at once as columns.
+
+Instead of building one Character at a time, generate_batch() draws the
+dice for every character in a handful of bulk calls and keeps the results
+in one column per attribute. Character objects are only built when a row
+is read back out of the batch.
+
+char_gen uses it for chunks of batch_threshold characters or more that
+have no constraints and aren't being profiled.
+"""
+
+
+from array import array
+
+from char_gen import Character, allocate_asi
+from char_gen_components import (
+    Alignment, Size, Stat, BaseClass, Race, asi_points, race_traits, base_proficiencies,
+    base_proficiency_masks, language_bits, proficiency_bits, race_rules, class_hit_dice,
+    hit_dice_names, class_skill_counts, class_skill_pools, class_tool_choices
+)
+from char_gen_rng import default_rng
+
+
+# Hit die size, indexed by BaseClass.value.
+_hit_die = tuple(class_hit_dice[char_class] for char_class in BaseClass)
+
+
+class CharacterBatch:
+    """Column-oriented collection of generated characters.
+
+    Every attribute of Character is held as a column with one entry per
+    character; stats are six columns indexed by Stat.value, and languages
+    and proficiencies are bitmask columns in the same layout Character uses,
+    with proficiencies holding only each character's random picks.
+    Rows are turned into Character objects on demand through indexing or
+    iteration.
+    """
+
+    def __init__(self, n, lvl):
+        self.count = n
+        self.level = lvl
+        self.gender = array("B")
+        self.race = array("B")
+        self.char_class = array("B")
+        self.alignment = array("B")
+        self.stats = [array("B") for _ in Stat]
+        self.health = array("H")
+        self.speed = array("B")
+        self.size = array("B")
+        self.languages = array("B")
+        self.proficiencies = []
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        """Build the Character stored in row i."""
+
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("character index out of range")
+
+        player = Character()
+        player.gender = bool(self.gender[i])
+        player.race = Race(self.race[i])
+        player.traits = race_traits[player.race]
+        player.char_class = BaseClass(self.char_class[i])
+        player.alignment = Alignment(self.alignment[i])
+        for stat in Stat:
+            player.stats[stat] = self.stats[stat.value][i]
+        player.level = self.level
+        player.health = self.health[i]
+        player.hit_dice = hit_dice_names[_hit_die[self.char_class[i]]]
+        player.speed = self.speed[i]
+        player.size = Size(self.size[i])
+        player.languages = self.languages[i]
+        player.proficiencies = self.proficiencies[i]
+        player._proficiency_base = base_proficiency_masks[player.race, player.char_class]
+
+        return player
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+
+def _roll_stats(batch, rng):
+    """Roll 4d6 drop lowest for all six stats of every character at once."""
+
+    scores = rng.ability_scores(len(Stat) * batch.count)
+
+    for stat in Stat:
+        batch.stats[stat.value] = array("B", scores[stat.value::6])
+
+
+def _apply_race_bonuses(batch, rng):
+    """Add racial stat bonuses from race_rules to every character, capped at 20."""
+
+    rules = [race_rules[race] for race in Race]
+
+    # Some races get extra +1 bonuses to random stats.
+    for i, race in enumerate(batch.race):
+        for _ in range(rules[race].stat_choices):
+            batch.stats[int(len(Stat) * rng.random())][i] += 1
+
+    for stat in Stat:
+        column = batch.stats[stat.value]
+        batch.stats[stat.value] = array("B", [
+            min(score + rules[race].stat_bonus[stat.value], 20)
+            for score, race in zip(column, batch.race)
+        ])
+
+    batch.speed = array("B", [rules[race].speed for race in batch.race])
+    batch.size = array("B", [rules[race].size.value for race in batch.race])
+
+
+def _apply_asi(batch, rng):
+    """Apply ASI stat bumps to every character with allocate_asi()."""
+
+    points = [asi_points(char_class, batch.level) for char_class in BaseClass]
+    if not any(points):
+        return
+
+    stats = batch.stats
+    for i, char_class in enumerate(batch.char_class):
+        scores = [column[i] for column in stats]
+        allocate_asi(scores, points[char_class], rng)
+        for column, score in zip(stats, scores):
+            column[i] = score
+
+
+def _roll_health(batch, rng, average):
+    """Compute hit points for every character, rolling level-up dice in bulk."""
+
+    extra_levels = max(batch.level - 1, 0)
+    constitution = batch.stats[Stat.CONSTITUTION.value]
+    health = [0] * batch.count
+
+    for die in set(_hit_die):
+        rows = [
+            i for i, char_class in enumerate(batch.char_class) if _hit_die[char_class] == die
+        ]
+
+        if average or not extra_levels:
+            rolled = [extra_levels * (die // 2 + 1)] * len(rows)
+        else:
+            rolls = rng.choices(range(1, die + 1), k=extra_levels * len(rows))
+            rolled = [
+                sum(rolls[start:start + extra_levels])
+                for start in range(0, len(rolls), extra_levels)
+            ]
+
+        for i, total in zip(rows, rolled):
+            health[i] = die + constitution[i] * (1 + extra_levels) + total
+
+    batch.health = array("H", health)
+
+
+def _assign_languages(batch, rng):
+    """Assign racial and extra languages to every character as bitmasks."""
+
+    masks = [sum(language_bits[x] for x in race_rules[race].languages) for race in Race]
+    choices = [race_rules[race].language_choices for race in Race]
+
+    for race in batch.race:
+        languages = masks[race]
+        if choices[race]:
+            languages |= language_bits[choices[race][int(len(choices[race]) * rng.random())]]
+        batch.languages.append(languages)
+
+
+def _assign_proficiencies(batch, rng):
+    """Pick random proficiencies for every character, stored as bitmasks.
+
+    Only the random picks are kept in the column; the shared race and class
+    base is looked up again when a Character is built.
+    """
+
+    for race, char_class in zip(batch.race, batch.char_class):
+        race, char_class = Race(race), BaseClass(char_class)
+        owned = set(base_proficiencies[race, char_class])
+
+        chosen = rng.draw_distinct(class_skill_pools[char_class],
+                                   class_skill_counts[char_class], owned)
+        if char_class in class_tool_choices:
+            owned.update(chosen)
+            pool, amount = class_tool_choices[char_class]
+            chosen += rng.draw_distinct(pool, amount, owned)
+
+        mask = 0
+        for proficiency in chosen:
+            mask |= proficiency_bits[proficiency]
+        batch.proficiencies.append(mask)
+
+
+def generate_batch(n, lvl, rng=default_rng, average_hp=False):
+    """Generate n characters of level lvl and return them as a CharacterBatch.
+
+    All dice are drawn from rng, and average_hp works as with generate().
+    """
+
+    batch = CharacterBatch(n, lvl)
+
+    batch.gender = array("B", [roll >= 50 for roll in rng.choices(range(1, 101), k=n)])
+    batch.race = array("B", rng.choices(range(len(Race)), k=n))
+    batch.char_class = array("B", rng.choices(range(len(BaseClass)), k=n))
+    batch.alignment = array("B", rng.choices(range(len(Alignment)), k=n))
+
+    _roll_stats(batch, rng)
+    _apply_race_bonuses(batch, rng)
+    _apply_asi(batch, rng)
+    _roll_health(batch, rng, average_hp)
+    _assign_languages(batch, rng)
+    _assign_proficiencies(batch, rng)
+
+    return batch
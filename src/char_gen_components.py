@@ -19,6 +19,7 @@
 """A collection of components used for the main character generator."""
 
 
+from collections import namedtuple
 from enum import Enum
 
 
@@ -252,6 +253,18 @@ class ToolProficiencies(Enum):
     THREE_DRAGON_ANTE_SET = 35
 
 
+# Final display label for every enum member above, e.g. Race.HALF_ELF is
+# shown as "Half Elf". Built once here so output does not have to rework
+# the enum names for every character.
+display_names = {
+    member: member.name.replace("_", " ").title()
+    for enum in (Race, Stat, Size, Language, Alignment, BaseClass, RaceTraits,
+                 StatProficiencies, TestProficiencies, BaseEquipProficiencies,
+                 EquipProficiencies, ToolProficiencies)
+    for member in enum
+}
+
+
 race_traits = {
     Race.HUMAN: [],
 
@@ -281,6 +294,150 @@ race_traits = {
 }
 
 
+# Racial traits of each race already joined into their printed form.
+race_trait_labels = {
+    race: ", ".join(display_names[trait] for trait in traits)
+    for race, traits in race_traits.items()
+}
+
+
+# Hit die size of each class.
+class_hit_dice = {
+    BaseClass.BARBARIAN: 12,
+    BaseClass.BARD: 8,
+    BaseClass.CLERIC: 8,
+    BaseClass.DRUID: 8,
+    BaseClass.FIGHTER: 10,
+    BaseClass.MONK: 8,
+    BaseClass.PALADIN: 10,
+    BaseClass.RANGER: 10,
+    BaseClass.ROGUE: 8,
+    BaseClass.SORCERER: 6,
+    BaseClass.WIZARD: 6,
+    BaseClass.WARLOCK: 8
+}
+
+hit_dice_names = {die: "1d{0}".format(die) for die in set(class_hit_dice.values())}
+
+
+# Milestone levels each class gets an ASI at. Fighters get extra.
+basic_asi_milestones = frozenset({4, 8, 12, 16, 19})
+fighter_asi_milestones = frozenset({4, 6, 8, 12, 14, 16, 19})
+
+class_asi_milestones = {
+    char_class: fighter_asi_milestones if char_class is BaseClass.FIGHTER
+    else basic_asi_milestones
+    for char_class in BaseClass
+}
+
+
+def asi_points(char_class, lvl):
+    """Number of ASI points a character of this class has earned by level lvl."""
+
+    # Each ASI milestone gives two points. Fighters get extra milestones.
+    return 2 * sum(lvl >= milestone for milestone in class_asi_milestones[char_class])
+
+
+""" Racial rules applied to a character when it is created.
+    stat_bonus      Bonus to each stat, indexed by Stat.value.
+    speed           Walk speed in feet.
+    size            Size of the race.
+    languages       Languages every member of the race speaks.
+    stat_choices    Number of extra +1 bonuses given to random stats.
+    language_choices  Languages one extra language is picked from, if any.
+"""
+RaceRule = namedtuple(
+    "RaceRule",
+    ["stat_bonus", "speed", "size", "languages", "stat_choices", "language_choices"]
+)
+
+race_rules = {
+    Race.HUMAN: RaceRule(
+        (1, 1, 1, 1, 1, 1), 30, Size.MEDIUM, (Language.COMMON,), 0,
+        (Language.ELVISH, Language.DWARVISH, Language.GNOMISH, Language.ORC,
+         Language.HALFLING, Language.DRACONIC, Language.INFERNAL)
+    ),
+
+    Race.ELF: RaceRule(
+        (0, 2, 0, 0, 0, 0), 30, Size.MEDIUM, (Language.COMMON, Language.ELVISH), 0, ()
+    ),
+
+    Race.DWARF: RaceRule(
+        (0, 0, 2, 0, 0, 0), 25, Size.MEDIUM, (Language.COMMON, Language.DWARVISH), 0, ()
+    ),
+
+    Race.GNOME: RaceRule(
+        (0, 0, 0, 2, 0, 0), 25, Size.SMALL, (Language.COMMON, Language.GNOMISH), 0, ()
+    ),
+
+    Race.HALFLING: RaceRule(
+        (0, 2, 0, 0, 0, 0), 25, Size.SMALL, (Language.COMMON, Language.HALFLING), 0, ()
+    ),
+
+    Race.HALF_ELF: RaceRule(
+        (0, 0, 0, 0, 0, 2), 30, Size.MEDIUM, (Language.COMMON, Language.ELVISH), 2,
+        (Language.DWARVISH, Language.GNOMISH, Language.ORC, Language.HALFLING,
+         Language.DRACONIC, Language.INFERNAL)
+    ),
+
+    Race.HALF_ORC: RaceRule(
+        (1, 0, 2, 0, 0, 0), 30, Size.MEDIUM, (Language.COMMON, Language.ORC), 0, ()
+    ),
+
+    Race.DRAGONBORN: RaceRule(
+        (2, 0, 1, 0, 0, 0), 30, Size.MEDIUM, (Language.COMMON, Language.DRACONIC), 0, ()
+    ),
+
+    Race.TIEFLING: RaceRule(
+        (0, 0, 0, 1, 0, 2), 30, Size.MEDIUM, (Language.COMMON, Language.INFERNAL), 0, ()
+    )
+}
+
+
+def load_race_rules(path):
+    """Replace entries of race_rules with homebrew rules read from a JSON file.
+
+    The file maps race names to rules, using enum member names for stats,
+    sizes and languages, for example:
+
+        {"DWARF": {"stat_bonus": {"CONSTITUTION": 2, "WISDOM": 1},
+                   "speed": 25, "size": "MEDIUM",
+                   "languages": ["COMMON", "DWARVISH"],
+                   "stat_choices": 0, "language_choices": []}}
+
+    Fields left out keep their current value. Only races in the Race enum
+    can be given rules.
+    """
+
+    import json
+
+    with open(path) as rules_file:
+        homebrew = json.load(rules_file)
+
+    for race_name, fields in homebrew.items():
+        rule = race_rules[Race[race_name]]
+
+        if "stat_bonus" in fields:
+            bonus = [0] * len(Stat)
+            for stat_name, value in fields["stat_bonus"].items():
+                bonus[Stat[stat_name].value] = value
+            rule = rule._replace(stat_bonus=tuple(bonus))
+        if "speed" in fields:
+            rule = rule._replace(speed=fields["speed"])
+        if "size" in fields:
+            rule = rule._replace(size=Size[fields["size"]])
+        if "languages" in fields:
+            rule = rule._replace(languages=tuple(Language[x] for x in fields["languages"]))
+        if "stat_choices" in fields:
+            rule = rule._replace(stat_choices=fields["stat_choices"])
+        if "language_choices" in fields:
+            rule = rule._replace(
+                language_choices=tuple(Language[x] for x in fields["language_choices"])
+            )
+
+        race_rules[Race[race_name]] = rule
+
+
 race_proficiencies = {
     Race.HUMAN: set(),
 
@@ -303,6 +460,21 @@ race_proficiencies = {
     Race.TIEFLING: set()
 }
 
+# Every proficiency enum member in one sequence, so that a character's
+# proficiencies can be stored as a single integer bitmask.
+proficiency_members = tuple(
+    member for proficiency in (StatProficiencies, TestProficiencies,
+                               BaseEquipProficiencies, EquipProficiencies,
+                               ToolProficiencies)
+    for member in proficiency
+)
+
+proficiency_bits = {member: 1 << i for i, member in enumerate(proficiency_members)}
+
+language_members = tuple(Language)
+
+language_bits = {member: 1 << i for i, member in enumerate(language_members)}
+
 """ Starting point for class-based proficiencies. This does NOT
     list all of the proficiencies to be assigned, as some are
     randomized. Due to the fact that if they were picked here,they
@@ -535,3 +707,75 @@ class_proficiency_choices = {
         TestProficiencies.RELIGION
     }
 }
+
+
+# How many skills each class picks from class_proficiency_choices.
+class_skill_counts = {
+    BaseClass.BARBARIAN: 2,
+    BaseClass.BARD: 3,
+    BaseClass.CLERIC: 2,
+    BaseClass.DRUID: 2,
+    BaseClass.FIGHTER: 2,
+    BaseClass.MONK: 2,
+    BaseClass.PALADIN: 2,
+    BaseClass.RANGER: 3,
+    BaseClass.ROGUE: 4,
+    BaseClass.SORCERER: 2,
+    BaseClass.WIZARD: 2,
+    BaseClass.WARLOCK: 2
+}
+
+# class_proficiency_choices as tuples in a fixed order, so that a seeded
+# rng picks the same skills in every process.
+class_skill_pools = {
+    char_class: tuple(sorted(choices, key=lambda x: x.value))
+    for char_class, choices in class_proficiency_choices.items()
+}
+
+# Monk can also choose one tool from anything except game sets, which
+# start at DICE_SET.
+monk_tool_pool = tuple(ToolProficiencies(x) for x in range(ToolProficiencies.DICE_SET.value))
+
+# Bard also chooses three instruments, BAGPIPES to VIOL inclusive.
+bard_instrument_pool = tuple(
+    ToolProficiencies(x) for x in range(ToolProficiencies.BAGPIPES.value,
+                                        ToolProficiencies.VIOL.value + 1)
+)
+
+# Extra tool choices for classes that get them, as (pool, how many).
+class_tool_choices = {
+    BaseClass.MONK: (monk_tool_pool, 1),
+    BaseClass.BARD: (bard_instrument_pool, 3)
+}
+
+
+# Racial and class proficiencies combined for every race and class, as
+# bitmasks over proficiency_members. Characters share these and only store
+# their own random picks on top.
+base_proficiency_masks = {
+    (race, char_class): race_mask | class_mask
+    for race, race_mask in (
+        (race, sum(proficiency_bits[x] for x in race_proficiencies[race])) for race in Race)
+    for char_class, class_mask in (
+        (char_class, sum(proficiency_bits[x] for x in class_proficiencies[char_class]))
+        for char_class in BaseClass)
+}
+
+
+def __getattr__(name):
+    """Build rarely used tables the first time they are imported.
+
+    base_proficiencies, the frozenset form of base_proficiency_masks, is
+    only needed by the batch engine, so plain generation never builds it.
+    """
+
+    if name == "base_proficiencies":
+        table = globals()[name] = {
+            (race, char_class): frozenset(race_proficiencies[race]
+                                          | class_proficiencies[char_class])
+            for race in Race
+            for char_class in BaseClass
+        }
+        return table
+
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
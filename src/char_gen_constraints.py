@@ -0,0 +1,487 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Constrained character generation.
+
+A Constraints object passed to char_gen.generate() limits the races,
+classes and alignments it picks from and sets minimum final stat scores.
+Races, classes and alignments are drawn directly from the allowed
+members. Minimum stats count everything a character gets, racial bonuses
+and ASI points included, and give the same characters as generating
+without them and keeping only the ones that meet them.
+"""
+
+
+from collections import Counter
+from itertools import product
+
+from char_gen_components import Alignment, BaseClass, Race, Stat, asi_points, race_rules
+from char_gen_rng import AliasTable, ability_score_weights
+
+
+def _allowed(enum, members):
+    """The allowed members of enum as a tuple ordered by value, all of them for None."""
+
+    if members is None:
+        return tuple(enum)
+
+    allowed = tuple(sorted(set(members), key=lambda member: member.value))
+    if not allowed:
+        raise ValueError("No {0} is allowed".format(enum.__name__))
+    return allowed
+
+
+def _advance(state, change):
+    """The _RollPlan state after one more stat falls in the class change, None if too short."""
+
+    left, unmet, safe, near = state
+    short, room, more_safe = change
+    if short:
+        if short > left:
+            return None
+        return left - short, tuple(sorted(unmet + ((short, room),))), safe, near
+    if room:
+        return left, unmet, safe, tuple(sorted(near + (room,)))
+    return left, unmet, safe + more_safe, near
+
+
+class _RollPlan:
+    """Initial rolls and random racial +1s for one race and number of ASI points.
+
+    They are drawn from 4d6 drop lowest and uniform +1s, weighted by the
+    Constraints._odds() of the points then covering min_stats. Every way
+    of placing the +1s gives its own bonuses. For each of those and each
+    slack, the number of points left over once every shortfall is
+    covered, the stats are drawn one at a time, the ones with minimums
+    first: a stat's roll falls short by some number of points, reaches
+    20, or is below 20 and near it or safe from it, and _tail() adds up
+    the weights of the rolls of the stats after it given the classes
+    drawn so far.
+    """
+
+    def __init__(self, constraints, rule, points):
+        self.constraints = constraints
+        self.points = points
+        minimums = constraints._minimums
+        self.order = sorted(range(len(Stat)), key=lambda stat: not minimums[stat])
+        self.limited = sum(map(bool, minimums))
+
+        # Each placing of the random +1s, as +1s per stat, and its number of orders.
+        placings = Counter(
+            tuple(picks.count(stat) for stat in range(len(Stat)))
+            for picks in product(range(len(Stat)), repeat=rule.stat_choices))
+
+        # The bonuses of the stats in order from each position onwards, so
+        # that placings agreeing on the rest of the stats share their tails.
+        self.extra = list(placings)
+        self.bonuses = []
+        for extra in self.extra:
+            bonus = [rule.stat_bonus[stat] + extra[stat] for stat in self.order]
+            self.bonuses.append([tuple(bonus[i:]) for i in range(len(Stat) + 1)])
+
+        self._classes = {}
+        self._tails = {}
+        self._steps = {}
+
+        starts = []
+        weights = []
+        for placing, ways in enumerate(placings.values()):
+            for slack in range(points + 1):
+                weight = ways * self._tail(self.bonuses[placing], slack, 0,
+                                           (points - slack, (), 0, ()))
+                if weight:
+                    starts.append((placing, slack))
+                    weights.append(weight)
+
+        self.chance = sum(weights) / 6 ** (4 * len(Stat) + rule.stat_choices)
+        if weights:
+            self._start = AliasTable(starts, weights)
+
+    def _stat_classes(self, stat, bonus, slack):
+        """(change, weight, score table) for each class stat's roll can fall in."""
+
+        key = (stat, bonus, slack)
+        classes = self._classes.get(key)
+        if classes is None:
+            minimum = self.constraints._minimums[stat]
+            scores = {}
+            for score, weight in ability_score_weights.items():
+                final = min(score + bonus, 20)
+                if final < minimum:
+                    change = (minimum - final, 20 - minimum, 0)
+                elif final == 20:
+                    change = (0, 0, 0)
+                elif 20 - final > slack:
+                    change = (0, 0, 1)
+                else:
+                    change = (0, 20 - final, 0)
+                scores.setdefault(change, {})[score] = weight
+
+            classes = self._classes[key] = [
+                (change, sum(weights.values()), AliasTable(weights, list(weights.values())))
+                for change, weights in scores.items()
+            ]
+        return classes
+
+    def _options(self, bonuses, slack, position, state):
+        """(state after, weight, score table) for each class of the roll at position."""
+
+        options = []
+        for change, chance, table in self._stat_classes(
+                self.order[position], bonuses[position][0], slack):
+            after = _advance(state, change)
+            if after is not None:
+                weight = chance * self._tail(bonuses, slack, position + 1, after)
+                if weight:
+                    options.append((after, weight, table))
+        return options
+
+    def _tail(self, bonuses, slack, position, state):
+        """Weight of the rolls of the stats from position on, starting from state."""
+
+        left, unmet, safe, near = state
+        if position >= self.limited and left:
+            # Only the stats with minimums can fall short.
+            return 0
+        if position == len(Stat):
+            return self.constraints._odds(slack, unmet, safe, near)
+
+        key = (bonuses[position], slack, position, state)
+        weight = self._tails.get(key)
+        if weight is None:
+            weight = self._tails[key] = sum(
+                option[1] for option in self._options(bonuses, slack, position, state))
+        return weight
+
+    def roll(self, scores, rng):
+        """Fill in the six initial scores, with the random racial +1s added."""
+
+        random = rng.random
+        placing, slack = self._start.sample(random())
+        bonuses = self.bonuses[placing]
+        extra = self.extra[placing]
+        state = (self.points - slack, (), 0, ())
+
+        for position, stat in enumerate(self.order):
+            key = (bonuses[position], slack, position, state)
+            step = self._steps.get(key)
+            if step is None:
+                options = self._options(bonuses, slack, position, state)
+                step = self._steps[key] = AliasTable(
+                    [(after, table) for after, weight, table in options],
+                    [weight for after, weight, table in options])
+
+            state, table = step.sample(random())
+            scores[stat] = table.sample(random()) + extra[stat]
+
+
+class Constraints:
+    """Limits on the characters generated.
+
+    races, classes and alignments hold the allowed members, or None to
+    allow any. min_stats maps a Stat to the lowest final score the
+    character may end up with, after racial bonuses and ASIs.
+
+    With min_stats, race, class, initial rolls and random racial +1s are
+    drawn in proportion to the odds of the ASI points then covering what
+    is still short, and cover_shortfall() places the points that cover
+    it, conditioned the same way, leaving the rest to be spent at random.
+    Every character is drawn once, from about twice the dice of an
+    unconstrained one, and the result is the same as filtering
+    unconstrained ones. The tables for this depend on the level and are
+    built by prepare() on first use.
+    """
+
+    def __init__(self, races=None, classes=None, alignments=None, min_stats=None):
+        self.races = _allowed(Race, races)
+        self.classes = _allowed(BaseClass, classes)
+        self.alignments = _allowed(Alignment, alignments)
+        self.min_stats = dict(min_stats or {})
+        self._minimums = bytes(self.min_stats.get(stat, 0) for stat in Stat)
+
+        for stat, minimum in self.min_stats.items():
+            if minimum > 20:
+                raise ValueError("{0} can't be more than 20".format(stat.name.title()))
+
+        # _RollPlan by race and ASI points, the race and class tables by
+        # level, and _odds() and the cover_shortfall() steps by state.
+        self._roll_plans = {}
+        self._levels = {}
+        self._odds_table = {}
+        self._steps = {}
+
+    def _roll_plan(self, race, char_class, lvl):
+        points = asi_points(char_class, lvl)
+        plan = self._roll_plans.get((race, points))
+        if plan is None:
+            plan = self._roll_plans[race, points] = _RollPlan(self, race_rules[race], points)
+        return plan
+
+    def _moves(self, slack, unmet, safe, near):
+        """(kind, ways, state after) for each kind of stat the next ASI point can go to.
+
+        A kind is the (score, minimum) of a stat below its minimum, the
+        (score, 0) of a near stat, or None for a safe one, and ways is the
+        number of stats of that kind. A point on anything but a short stat
+        uses up slack, so the stats exactly slack away from 20 become safe.
+        """
+
+        moves = []
+        for short, room in sorted(set(unmet)):
+            rest = list(unmet)
+            rest.remove((short, room))
+            if short > 1:
+                after = (slack, tuple(sorted(rest + [(short - 1, room)])), safe, near)
+            elif not room:
+                after = (slack, tuple(rest), safe, near)
+            elif room > slack:
+                after = (slack, tuple(rest), safe + 1, near)
+            else:
+                after = (slack, tuple(rest), safe, tuple(sorted(near + (room,))))
+            moves.append(((20 - room - short, 20 - room), unmet.count((short, room)), after))
+
+        if slack:
+            closer = tuple(room for room in near if room < slack)
+            now_safe = safe + len(near) - len(closer)
+            if safe:
+                moves.append((None, safe, (slack - 1, unmet, now_safe, closer)))
+            for room in sorted(set(near)):
+                rest = list(closer)
+                if room < slack:
+                    rest.remove(room)
+                if room > 1:
+                    rest.append(room - 1)
+                after = (slack - 1, unmet, now_safe - (room == slack), tuple(sorted(rest)))
+                moves.append(((20 - room, 0), near.count(room), after))
+
+        return moves
+
+    def _odds(self, slack, unmet, safe, near):
+        """Chance of the ASI points left covering every shortfall.
+
+        unmet holds a (short, room) pair for each stat below its minimum,
+        room being how far the minimum is below 20, and slack is the
+        number of points left over once they are all covered. Of the
+        other stats below 20, the safe ones are too far from 20 to reach
+        it within the slack and the near ones, given by how far they are
+        from 20, aren't. Each point goes to any stat below 20 alike.
+        """
+
+        if not unmet:
+            return 1.0
+
+        key = (slack, unmet, safe, near)
+        odds = self._odds_table.get(key)
+        if odds is None:
+            total = sum(ways * self._odds(*after) for kind, ways, after in self._moves(*key))
+            odds = self._odds_table[key] = total / (len(unmet) + safe + len(near))
+        return odds
+
+    def _state(self, scores, points):
+        """The _odds() arguments for scores with points to spend, None if they fall short."""
+
+        unmet = []
+        others = []
+        slack = points
+        for score, minimum in zip(scores, self._minimums):
+            if score < minimum:
+                unmet.append((minimum - score, 20 - minimum))
+                slack -= minimum - score
+            elif score < 20:
+                others.append(20 - score)
+
+        if slack < 0:
+            return None
+        near = tuple(sorted(room for room in others if room <= slack))
+        return slack, tuple(sorted(unmet)), len(others) - len(near), near
+
+    def prepare(self, lvl):
+        """Build the tables for level lvl, if min_stats needs them.
+
+        Raises ValueError if no allowed race and class can reach min_stats
+        at that level.
+        """
+
+        if not self.min_stats or lvl in self._levels:
+            return
+
+        race_weights = []
+        class_tables = {}
+        for race in self.races:
+            weights = [self._roll_plan(race, char_class, lvl).chance
+                       for char_class in self.classes]
+            race_weights.append(sum(weights))
+            if sum(weights):
+                class_tables[race] = AliasTable(self.classes, weights)
+
+        if not class_tables:
+            raise ValueError("No allowed race and class can reach the minimum stats "
+                             "at level {0}".format(lvl))
+
+        self._levels[lvl] = (AliasTable(self.races, race_weights), class_tables)
+
+    def race(self, player, lvl, rng):
+        """Pick an allowed race, weighted by its odds of reaching min_stats."""
+
+        if self.min_stats:
+            self.prepare(lvl)
+            player.race = self._levels[lvl][0].sample(rng.random())
+        else:
+            player.race = self.races[rng.randint(0, len(self.races) - 1)]
+
+    def char_class(self, player, lvl, rng):
+        """Pick one of the allowed classes, weighted like race() for player's race."""
+
+        if self.min_stats:
+            player.char_class = self._levels[lvl][1][player.race].sample(rng.random())
+        else:
+            player.char_class = self.classes[rng.randint(0, len(self.classes) - 1)]
+
+    def alignment(self, player, rng):
+        """Pick one of the allowed alignments."""
+
+        player.alignment = self.alignments[rng.randint(0, len(self.alignments) - 1)]
+
+    def stats(self, player, lvl, rng):
+        """Roll initial stats and place the race's random +1s on them.
+
+        char_gen.race_stat_effects() then only adds the fixed bonuses.
+        """
+
+        scores = player._stats
+        if self.min_stats:
+            self._roll_plan(player.race, player.char_class, lvl).roll(scores, rng)
+        else:
+            scores[:] = bytes(rng.ability_scores(len(scores)))
+            for _ in range(race_rules[player.race].stat_choices):
+                scores[rng.randint(0, 5)] += 1
+
+    def cover_shortfall(self, player, rng):
+        """Spend the ASI points min_stats needs, returning the number left to spend.
+
+        Each point goes to a stat below 20 with its real chance of doing
+        so, weighted by the _odds() of the minimums being met afterwards,
+        so every shortfall is covered without ever generating again. The
+        steps are kept by state, making a point one table draw and a scan
+        for the stats of the kind drawn. Once nothing is short, the slack
+        is left to spend at random like any other character's points.
+        """
+
+        scores = player._stats
+        points = asi_points(player.char_class, player.level)
+        if not self.min_stats:
+            return points
+
+        minimums = self._minimums
+        random = rng.random
+        state = self._state(scores, points)
+
+        while state[1]:
+            step = self._steps.get(state)
+            if step is None:
+                moves = [(kind, after, ways * self._odds(*after))
+                         for kind, ways, after in self._moves(*state)]
+                step = self._steps[state] = AliasTable(
+                    [(kind, after) for kind, after, weight in moves if weight],
+                    [weight for kind, after, weight in moves if weight])
+
+            kind, after = step.sample(random())
+            if kind is None:
+                slack = state[0]
+                stats = [stat for stat, score in enumerate(scores)
+                         if minimums[stat] <= score < 20 - slack]
+            else:
+                score, minimum = kind
+                stats = [stat for stat in range(len(scores)) if scores[stat] == score
+                         and (minimums[stat] == minimum if minimum else minimums[stat] <= score)]
+
+            stat = stats[rng.randint(0, len(stats) - 1)] if len(stats) > 1 else stats[0]
+            scores[stat] += 1
+            state = after
+
+        return state[0]
+
+
+def _name_key(text):
+    """Normalise a name typed on the command line to enum member name form."""
+
+    return text.strip().upper().replace("-", "_").replace(" ", "_")
+
+
+def parse_members(text, enum):
+    """Parse a comma separated list of enum member names.
+
+    A name matching a member exactly picks that member; otherwise it picks
+    every member with all of its words, so 'evil' stands for every evil
+    alignment. Names starting with '!' are excluded instead, from the
+    listed members or from every member if only exclusions are given.
+    """
+
+    included = set()
+    excluded = set()
+    any_included = False
+
+    for term in text.split(","):
+        if not term.strip():
+            continue
+
+        target = included
+        if term.strip().startswith("!"):
+            target = excluded
+            term = term.strip()[1:]
+        else:
+            any_included = True
+
+        key = _name_key(term)
+        if key in enum.__members__:
+            matches = {enum[key]}
+        else:
+            words = set(key.split("_"))
+            matches = {member for member in enum if words <= set(member.name.split("_"))}
+        if not matches:
+            raise ValueError("Unknown {0}: {1}".format(enum.__name__, term.strip()))
+        target.update(matches)
+
+    if not any_included:
+        included = set(enum)
+    return included - excluded
+
+
+def parse_min_stats(text):
+    """Parse minimum stats such as 'INT=16,DEX=14' into a {Stat: score} dict.
+
+    Stats can be given by full name or by any unambiguous start of one.
+    """
+
+    min_stats = {}
+
+    for term in text.split(","):
+        if not term.strip():
+            continue
+
+        name, separator, score = term.partition("=")
+        if not separator:
+            raise ValueError("Minimum stats are given as STAT=SCORE: {0}".format(term))
+
+        key = _name_key(name)
+        matches = [stat for stat in Stat if key and stat.name.startswith(key)]
+        if len(matches) != 1:
+            raise ValueError("Unknown stat: {0}".format(name.strip()))
+        min_stats[matches[0]] = int(score)
+
+    return min_stats
@@ -0,0 +1,407 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Buffered output of generated characters.
+
+Characters can be written as the plain text shown by print_char(), as
+JSON Lines, CSV or MessagePack records of integer codes, or as the binary
+records of char_gen_store, one character at a time.
+"""
+
+
+from struct import pack
+
+from char_gen_components import (
+    Alignment, BaseClass, Race, Size, class_hit_dice, display_names, language_members,
+    proficiency_members, race_trait_labels
+)
+
+
+# Joined labels for language and proficiency bitmasks seen so far. Most
+# characters share one of a small number of combinations, so the joined
+# text is reused far more often than it is built.
+_language_text = {}
+_proficiency_text = {}
+_mask_text_limit = 1 << 14
+
+_template = (
+    "Gender: {0}\n"
+    "Race: {1}\n"
+    "Size: {2}\n"
+    "Walk speed: {3} feet\n"
+    "Racial Traits: {4}\n"
+    "Class: {5}\n"
+    "Level: {6}\n"
+    "HP: {7}\n"
+    "Hit Dice: {8}\n"
+    "Alignment: {9}\n"
+    "Strength: {10}\n"
+    "Dexterity: {11}\n"
+    "Constitution: {12}\n"
+    "Intelligence: {13}\n"
+    "Wisdom: {14}\n"
+    "Charisma: {15}\n"
+    "Languages Spoken: {16}\n"
+    "Proficiencies: {17}\n"
+    "\n"  # Empty line between characters
+)
+
+
+def _mask_text(mask, members, cache):
+    """Join the display names of the enum members set in a bitmask."""
+
+    text = cache.get(mask)
+    if text is None:
+        labels = []
+        rest = mask
+        while rest:
+            low = rest & -rest
+            labels.append(display_names[members[low.bit_length() - 1]])
+            rest ^= low
+
+        text = ", ".join(labels)
+        if len(cache) < _mask_text_limit:
+            cache[mask] = text
+
+    return text
+
+
+def render_char(character):
+    """Render every attribute of a character as a block of text."""
+
+    labels = display_names
+
+    return _template.format(
+        "Female" if character.gender else "Male",
+        labels[character.race],
+        labels[character.size],
+        character.speed,
+        race_trait_labels[character.race],
+        labels[character.char_class],
+        character.level,
+        character.health,
+        character.hit_dice,
+        labels[character.alignment],
+        *character.stats.values(),
+        _mask_text(character.languages.mask, language_members, _language_text),
+        _mask_text(character.proficiencies.mask, proficiency_members, _proficiency_text)
+    )
+
+
+class CharacterWriter:
+    """Writes rendered characters to a binary stream in large blocks.
+
+    Characters are rendered into one reusable buffer, which is only written
+    to the stream once it holds at least buffer_size bytes, or on flush().
+    This base writer produces the plain text shown by print_char();
+    subclasses override render() and header() for other formats.
+    """
+
+    def __init__(self, stream, buffer_size=1 << 16):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def render(self, character):
+        """Render a single character as bytes."""
+
+        return render_char(character).encode()
+
+    def header(self):
+        """Bytes describing the format, written once before any characters."""
+
+        return b""
+
+    def write_header(self):
+        """Add the format's header, if it has one, to the buffer."""
+
+        self.write_raw(self.header())
+
+    def write(self, character):
+        """Render a character into the buffer."""
+
+        self._buffer += self.render(character)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_raw(self, data):
+        """Add already rendered bytes, such as a chunk from a worker, to the buffer."""
+
+        self._buffer += data
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write everything in the buffer out to the stream."""
+
+        if self._buffer:
+            self.stream.write(self._buffer)
+            self._buffer.clear()
+        self.stream.flush()
+
+
+# Fields of a structured record, in order. Enum fields hold the member's
+# value, gender is 1 for female, hit_die is the number of sides and
+# languages and proficiencies are bitmasks over language_members and
+# proficiency_members.
+record_fields = (
+    "gender", "race", "char_class", "alignment", "level", "health", "hit_die",
+    "speed", "size", "strength", "dexterity", "constitution", "intelligence",
+    "wisdom", "charisma", "languages", "proficiencies"
+)
+
+
+def character_record(character):
+    """Flatten a character into a tuple of integer codes matching record_fields."""
+
+    return (
+        1 if character.gender else 0,
+        character.race.value,
+        character.char_class.value,
+        character.alignment.value,
+        character.level,
+        character.health,
+        class_hit_dice[character.char_class],
+        character.speed,
+        character.size.value,
+        *character.stats.values(),
+        character.languages.mask,
+        character.proficiencies.mask
+    )
+
+
+# Width of the proficiency bitmask when written as bytes, as in char_gen_store.
+proficiency_mask_bytes = 16
+
+
+def json_record(character):
+    """character_record() as a dict for JSON, with the proficiency bitmask as text.
+
+    The proficiency bitmask can be wider than the 53 bits JSON numbers
+    reliably hold, so it is written as proficiency_mask_bytes * 2 hex digits.
+    """
+
+    record = dict(zip(record_fields, character_record(character)))
+    record["proficiencies"] = format(record["proficiencies"],
+                                     "0{0}x".format(proficiency_mask_bytes * 2))
+    return record
+
+
+def record_schema():
+    """Describe record_fields and the labels behind each field's integer codes."""
+
+    return {
+        "version": 2,
+        "fields": list(record_fields),
+        # How the proficiency bitmask is written in each format; every
+        # other field is a plain integer everywhere.
+        "encodings": {
+            "proficiencies": {
+                "jsonl": "string of {0} hex digits".format(proficiency_mask_bytes * 2),
+                "csv": "decimal integer",
+                "msgpack": "bin of {0} bytes, little-endian".format(proficiency_mask_bytes)
+            }
+        },
+        "codes": {
+            "gender": ["Male", "Female"],
+            "race": [display_names[x] for x in Race],
+            "char_class": [display_names[x] for x in BaseClass],
+            "alignment": [display_names[x] for x in Alignment],
+            "size": [display_names[x] for x in Size],
+            "languages": [display_names[x] for x in language_members],
+            "proficiencies": [display_names[x] for x in proficiency_members]
+        }
+    }
+
+
+class JsonLinesWriter(CharacterWriter):
+    """Writes one JSON object per character, as made by json_record().
+
+    With schema set, the first line holds record_schema().
+    """
+
+    def __init__(self, stream, buffer_size=1 << 16, schema=False):
+        import json  # Only loaded when JSON output is asked for
+
+        super().__init__(stream, buffer_size)
+        self.schema = schema
+        self._dumps = json.dumps
+
+    def render(self, character):
+        return (self._dumps(json_record(character), separators=(",", ":")) + "\n").encode()
+
+    def header(self):
+        if not self.schema:
+            return b""
+        return (self._dumps(record_schema(), separators=(",", ":")) + "\n").encode()
+
+
+class CsvWriter(CharacterWriter):
+    """Writes one comma separated row of integer codes per character.
+
+    With schema set, the first row holds the field names.
+    """
+
+    def __init__(self, stream, buffer_size=1 << 16, schema=False):
+        super().__init__(stream, buffer_size)
+        self.schema = schema
+
+    def render(self, character):
+        # Every field is an integer, so no quoting is ever needed.
+        return (",".join(map(str, character_record(character))) + "\n").encode()
+
+    def header(self):
+        if not self.schema:
+            return b""
+        return (",".join(record_fields) + "\n").encode()
+
+
+class MsgPackWriter(CharacterWriter):
+    """Writes one MessagePack array of integer codes per character.
+
+    The proficiency bitmask is always written as a bin of
+    proficiency_mask_bytes little-endian bytes, as it doesn't fit in a
+    MessagePack integer for every class. With schema set, the first object
+    is record_schema() as a map.
+    """
+
+    def __init__(self, stream, buffer_size=1 << 16, schema=False):
+        super().__init__(stream, buffer_size)
+        self.schema = schema
+
+    def render(self, character):
+        record = character_record(character)
+        out = bytearray()
+        _msgpack(record[:-1] + (record[-1].to_bytes(proficiency_mask_bytes, "little"),), out)
+        return out
+
+    def header(self):
+        if not self.schema:
+            return b""
+        out = bytearray()
+        _msgpack(record_schema(), out)
+        return out
+
+
+class StoreWriter(CharacterWriter):
+    """Writes the fixed-width binary records read by char_gen_store.CharacterStore.
+
+    The header always has a record count of 0, meaning the count comes
+    from the file size, as the stream may not allow going back to fill it
+    in. char_gen_store.write_store() does fill it in.
+    """
+
+    def __init__(self, stream, buffer_size=1 << 16, schema=False):
+        from char_gen_store import pack_character, pack_header
+
+        super().__init__(stream, buffer_size)
+        self.render = pack_character
+        self._pack_header = pack_header
+
+    def header(self):
+        return self._pack_header()
+
+
+def _msgpack(value, out):
+    """Append the MessagePack encoding of value to the bytearray out.
+
+    Only the types used by records and the schema are supported: None,
+    bool, int, str, bytes, list, tuple and dict.
+    """
+
+    if value is None:
+        out.append(0xc0)
+    elif value is True:
+        out.append(0xc3)
+    elif value is False:
+        out.append(0xc2)
+    elif isinstance(value, int):
+        if 0 <= value < 0x80:
+            out.append(value)
+        elif 0 <= value < 1 << 8:
+            out += pack(">BB", 0xcc, value)
+        elif 0 <= value < 1 << 16:
+            out += pack(">BH", 0xcd, value)
+        elif 0 <= value < 1 << 32:
+            out += pack(">BI", 0xce, value)
+        elif 0 <= value < 1 << 64:
+            out += pack(">BQ", 0xcf, value)
+        elif -0x20 <= value < 0:
+            out.append(value & 0xff)
+        elif -(1 << 63) <= value < 0:
+            out += pack(">Bq", 0xd3, value)
+        elif value > 0:
+            _msgpack(value.to_bytes((value.bit_length() + 7) // 8, "little"), out)
+        else:
+            raise ValueError("Cannot encode negative integer {0}".format(value))
+    elif isinstance(value, str):
+        data = value.encode()
+        if len(data) < 0x20:
+            out.append(0xa0 | len(data))
+        elif len(data) < 1 << 8:
+            out += pack(">BB", 0xd9, len(data))
+        elif len(data) < 1 << 16:
+            out += pack(">BH", 0xda, len(data))
+        else:
+            out += pack(">BI", 0xdb, len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        if len(value) < 1 << 8:
+            out += pack(">BB", 0xc4, len(value))
+        elif len(value) < 1 << 16:
+            out += pack(">BH", 0xc5, len(value))
+        else:
+            out += pack(">BI", 0xc6, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        if len(value) < 0x10:
+            out.append(0x90 | len(value))
+        elif len(value) < 1 << 16:
+            out += pack(">BH", 0xdc, len(value))
+        else:
+            out += pack(">BI", 0xdd, len(value))
+        for item in value:
+            _msgpack(item, out)
+    elif isinstance(value, dict):
+        if len(value) < 0x10:
+            out.append(0x80 | len(value))
+        elif len(value) < 1 << 16:
+            out += pack(">BH", 0xde, len(value))
+        else:
+            out += pack(">BI", 0xdf, len(value))
+        for key, item in value.items():
+            _msgpack(key, out)
+            _msgpack(item, out)
+    else:
+        raise TypeError("Cannot encode {0!r} as MessagePack".format(value))
+
+
+# Writer class for each --format choice.
+writers = {
+    "text": CharacterWriter,
+    "jsonl": JsonLinesWriter,
+    "csv": CsvWriter,
+    "msgpack": MsgPackWriter,
+    "store": StoreWriter
+}
@@ -0,0 +1,186 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Indexed in-memory pool of generated characters.
+
+A CharacterPool keeps a bitmap, as a Python int with bit i standing for
+character i, for every race, class, alignment, level, language and
+proficiency, and for every stat, one bitmap per minimum score. A query is
+then a handful of ORs and ANDs over those bitmaps instead of a scan over
+the characters.
+
+Bitmaps are built from one byte per character columns with bytes.translate()
+and int(text, 2), so building and reading them back runs at C speed.
+"""
+
+
+import re
+from itertools import compress
+
+from char_gen_components import (
+    Alignment, BaseClass, Race, Stat, language_bits, language_members, proficiency_members
+)
+
+
+# Bytes of the proficiency bitmask kept per character.
+_proficiency_bytes = (len(proficiency_members) + 7) // 8
+
+# Translates the text of a bitmap, one '0' or '1' per character, to 0 and 1 bytes.
+_digit_flags = bytes.maketrans(b"01", b"\x00\x01")
+
+# Positions of the bits set in every byte value.
+_byte_bits = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+_nonzero_byte = re.compile(rb"[^\x00]")
+
+
+def _column_bitmap(column, selected):
+    """Bitmap of the positions in column, a bytes object, holding a byte in selected."""
+
+    table = bytes(0x31 if value in selected else 0x30 for value in range(256))
+    digits = column.translate(table)
+    return int(digits[::-1], 2) if digits else 0
+
+
+class CharacterPool:
+    """Characters indexed by bitmaps for fast filtering.
+
+    Built once from a sequence of characters, after which query() combines
+    the bitmaps for its limits and indexes() or select() turn the result
+    back into positions or characters.
+    """
+
+    def __init__(self, characters):
+        self.characters = list(characters)
+        self.count = len(self.characters)
+
+        race = bytearray()
+        char_class = bytearray()
+        alignment = bytearray()
+        level = bytearray()
+        stats = [bytearray() for _ in Stat]
+        languages = bytearray()
+        proficiencies = bytearray()
+
+        for character in self.characters:
+            race.append(character.race.value)
+            char_class.append(character.char_class.value)
+            alignment.append(character.alignment.value)
+            level.append(character.level)
+            for column, score in zip(stats, character._stats):
+                column.append(score)
+            languages.append(character.languages.mask)
+            proficiencies += character.proficiencies.mask.to_bytes(_proficiency_bytes, "little")
+
+        self.races = {member: _column_bitmap(race, {member.value}) for member in Race}
+        self.classes = {member: _column_bitmap(char_class, {member.value}) for member in BaseClass}
+        self.alignments = {
+            member: _column_bitmap(alignment, {member.value}) for member in Alignment
+        }
+        self.levels = {value: _column_bitmap(level, {value}) for value in set(level)}
+
+        # A bit's column of the language or proficiency masks holds the
+        # bytes with that bit set.
+        self.languages = {
+            member: _column_bitmap(languages, {
+                value for value in range(256) if value & language_bits[member]})
+            for member in language_members
+        }
+        self.proficiencies = {}
+        for i, member in enumerate(proficiency_members):
+            column = bytes(proficiencies[i // 8::_proficiency_bytes])
+            self.proficiencies[member] = _column_bitmap(column, {
+                value for value in range(256) if value >> (i % 8) & 1})
+
+        # Bitmaps of the characters with at least each score, per stat.
+        self.min_stats = {}
+        for stat, column in zip(Stat, stats):
+            at_least = {}
+            running = 0
+            for score in range(max(column, default=0), -1, -1):
+                running |= _column_bitmap(bytes(column), {score})
+                at_least[score] = running
+            self.min_stats[stat] = at_least
+
+    def __len__(self):
+        return self.count
+
+    def _at_least(self, stat, score):
+        at_least = self.min_stats[stat]
+        return at_least.get(max(score, 0), 0)
+
+    def query(self, races=None, classes=None, alignments=None, levels=None, min_stats=None,
+              max_stats=None, languages=(), proficiencies=()):
+        """Bitmap of the characters matching every limit given.
+
+        races, classes, alignments and levels hold the allowed members or
+        values, any of which may match; a range() works as a level band.
+        min_stats and max_stats map a Stat to the lowest or highest score
+        allowed, and every one of languages and proficiencies must be had.
+        """
+
+        result = (1 << self.count) - 1
+
+        for allowed, bitmaps in ((races, self.races), (classes, self.classes),
+                                 (alignments, self.alignments), (levels, self.levels)):
+            if allowed is not None:
+                union = 0
+                for value in allowed:
+                    union |= bitmaps.get(value, 0)
+                result &= union
+
+        for stat, score in (min_stats or {}).items():
+            result &= self._at_least(stat, score)
+        for stat, score in (max_stats or {}).items():
+            result &= ~self._at_least(stat, score + 1)
+
+        for member in languages:
+            result &= self.languages[member]
+        for member in proficiencies:
+            result &= self.proficiencies[member]
+
+        return result
+
+    def indexes(self, bitmap):
+        """Positions of the characters in bitmap, in order."""
+
+        if not bitmap:
+            return []
+
+        if bitmap.bit_count() * 64 < self.count:
+            # Few matches: only visit the bytes of the bitmap that aren't 0.
+            data = bitmap.to_bytes((self.count + 7) // 8, "little")
+            positions = []
+            for match in _nonzero_byte.finditer(data):
+                start = match.start()
+                positions += [start * 8 + bit for bit in _byte_bits[data[start]]]
+            return positions
+
+        flags = format(bitmap, "0{0}b".format(self.count))[::-1].encode()
+        return list(compress(range(self.count), flags.translate(_digit_flags)))
+
+    def select(self, bitmap):
+        """The characters in bitmap, in order."""
+
+        characters = self.characters
+        return [characters[i] for i in self.indexes(bitmap)]
+
+    def count_of(self, bitmap):
+        """Number of characters in bitmap."""
+
+        return bitmap.bit_count()
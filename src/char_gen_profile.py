@@ -0,0 +1,150 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Per-stage instrumentation for character generation.
+
+A StageProfiler installed with char_gen.set_profiler() runs every stage of
+generate() through run(), which calls any registered hooks and keeps
+wall time, call and dice drawn counters per stage. While no profiler is
+installed, generate() calls its stages directly and none of this runs.
+"""
+
+
+from collections import Counter, defaultdict
+from time import perf_counter
+
+
+# Methods of a Dice that don't draw anything.
+_no_draws = frozenset(("seed", "set_stream", "getstate", "setstate"))
+
+
+def _draws(name, args, kwargs, result):
+    """Number of results a call to the Dice method name drew.
+
+    Counted from what the call asked for rather than from the underlying
+    generator, so BufferedDice blocks and CounterDice words count the same
+    as plain Dice draws.
+    """
+
+    if name in _no_draws:
+        return 0
+    if name == "roll":
+        return args[1] if len(args) > 1 else kwargs.get("count", 1)
+    if name == "shuffle":
+        return max(len(args[0]) - 1, 0)
+    if isinstance(result, list):
+        # ability_scores(), draw_distinct(), choices() and sample()
+        return len(result)
+    return 1
+
+
+class _CountingRng:
+    """Wraps a Dice, counting the results drawn against the stage drawing them."""
+
+    def __init__(self, rng, profiler):
+        self._rng = rng
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        attr = getattr(self._rng, name)
+        if not callable(attr):
+            return attr
+
+        draws = self._profiler.draws
+
+        def counted(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            draws[self._profiler.stage] += _draws(name, args, kwargs, result)
+            return result
+
+        return counted
+
+
+class StageProfiler:
+    """Collects hooks and counters for the stages of generate().
+
+    Hooks are called as hook(stage_name, player) right before (pre) or after
+    (post) the named stage runs. Stage functions or hooks can add their own
+    named counts with count().
+    """
+
+    def __init__(self):
+        self.pre_hooks = defaultdict(list)
+        self.post_hooks = defaultdict(list)
+        self.wall_time = Counter()
+        self.calls = Counter()
+        self.draws = Counter()
+        self.counters = Counter()
+        self.characters = 0
+        self.stage = None
+
+    def add_hook(self, stage, pre=None, post=None):
+        """Register functions to call before and/or after the named stage."""
+
+        if pre is not None:
+            self.pre_hooks[stage].append(pre)
+        if post is not None:
+            self.post_hooks[stage].append(post)
+
+    def count(self, name, amount=1):
+        """Add amount to the named counter."""
+
+        self.counters[name] += amount
+
+    def run(self, player, stages, lvl, rng, average_hp):
+        """Run the stages of generate() on player, timing and counting each one."""
+
+        rng = _CountingRng(rng, self)
+
+        for name, stage in stages:
+            self.stage = name
+            for hook in self.pre_hooks[name]:
+                hook(name, player)
+
+            start = perf_counter()
+            stage(player, lvl, rng, average_hp)
+            self.wall_time[name] += perf_counter() - start
+            self.calls[name] += 1
+
+            for hook in self.post_hooks[name]:
+                hook(name, player)
+
+        self.stage = None
+        self.characters += 1
+        return player
+
+    def report(self):
+        """Per-stage breakdown of the counters as a text table."""
+
+        total = sum(self.wall_time.values()) or 1.0
+        lines = [
+            "Profiled {0} characters".format(self.characters),
+            "{0:<20} {1:>10} {2:>12} {3:>14} {4:>12} {5:>7}".format(
+                "Stage", "Calls", "Total (s)", "Per call (us)", "Dice drawn", "Share")
+        ]
+
+        for name, seconds in self.wall_time.most_common():
+            calls = self.calls[name]
+            lines.append("{0:<20} {1:>10} {2:>12.4f} {3:>14.3f} {4:>12} {5:>6.1%}".format(
+                name, calls, seconds, seconds / calls * 1e6, self.draws[name],
+                seconds / total))
+
+        for name, amount in sorted(self.counters.items()):
+            lines.append("{0}: {1}".format(name, amount))
+
+        return "\n".join(lines)
@@ -0,0 +1,250 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Random number sources for character generation.
+
+Every generation step draws from a Dice object passed to it, so a run can
+be reproduced from its seed and separate runs can use independent streams.
+"""
+
+
+from random import Random
+from struct import Struct
+
+
+class AliasTable:
+    """Sampler for a fixed discrete distribution using Walker's alias method.
+
+    Each draw costs one uniform random number and one table lookup, however
+    many outcomes the distribution has.
+    """
+
+    def __init__(self, outcomes, weights):
+        count = len(weights)
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+
+        self.outcomes = tuple(outcomes)
+        self._prob = [1.0] * count
+        self._alias = list(range(count))
+
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+    def sample(self, u):
+        """Map a uniform number in [0, 1) to an outcome."""
+
+        u *= len(self.outcomes)
+        i = int(u)
+        if u - i < self._prob[i]:
+            return self.outcomes[i]
+        return self.outcomes[self._alias[i]]
+
+
+# Number of ways out of 6 ** 4 to roll each ability score with 4d6 drop
+# lowest, counted once by enumerating every roll and kept as a literal so
+# it is not recounted at every startup.
+ability_score_weights = {
+    3: 1, 4: 4, 5: 10, 6: 21, 7: 38, 8: 62, 9: 91, 10: 122, 11: 148, 12: 167,
+    13: 172, 14: 160, 15: 131, 16: 94, 17: 54, 18: 21
+}
+
+ability_score_table = AliasTable(ability_score_weights.keys(),
+                                 list(ability_score_weights.values()))
+
+
+class Dice(Random):
+    """Seedable random number source used by every generation step."""
+
+    def ability_score(self):
+        """Roll one ability score, distributed exactly like 4d6 drop lowest."""
+
+        return ability_score_table.sample(self.random())
+
+    def ability_scores(self, count):
+        """Roll count ability scores at once."""
+
+        sample = ability_score_table.sample
+        random = self.random
+        return [sample(random()) for i in range(count)]
+
+    def draw_distinct(self, pool, count, exclude=()):
+        """Draw count distinct items from pool, skipping any that are in exclude.
+
+        Uses a partial Fisher-Yates shuffle over the allowed items, so it
+        takes exactly count draws. If fewer than count items are allowed,
+        all of them are returned.
+        """
+
+        options = [item for item in pool if item not in exclude]
+        count = min(count, len(options))
+        last = len(options) - 1
+
+        for i in range(count):
+            j = self.randint(i, last)
+            options[i], options[j] = options[j], options[i]
+
+        return options[:count]
+
+    def roll(self, sides, count=1):
+        """Roll count dice with the given number of sides and return the total."""
+
+        return sum(self.choices(range(1, sides + 1), k=count))
+
+
+class BufferedDice(Dice):
+    """Dice that pre-draws results in blocks.
+
+    The first roll of a given range draws block_size results for that range
+    at once, and later rolls are served from that block until it runs out.
+    This replaces one randint() call per die with one list pop.
+    """
+
+    def __init__(self, x=None, block_size=4096):
+        self.block_size = block_size
+        self._blocks = {}
+        super().__init__(x)
+
+    def seed(self, a=None, version=2):
+        super().seed(a, version)
+        self._blocks = {}
+
+    def randint(self, a, b):
+        span = b - a + 1
+        block = self._blocks.get(span)
+        if not block:
+            block = self._blocks[span] = self.choices(range(span), k=self.block_size)
+        return a + block.pop()
+
+    def roll(self, sides, count=1):
+        block = self._blocks.get(sides)
+        if block is None or len(block) < count:
+            if block is None:
+                block = self._blocks[sides] = []
+            block += self.choices(range(sides), k=max(count, self.block_size))
+
+        total = count
+        for i in range(count):
+            total += block.pop()
+        return total
+
+
+# Stream number and block counter hashed for each block of a CounterDice.
+_counter_block = Struct("<QQ")
+
+# Unpacks a 64 byte hash into eight 64-bit words.
+_counter_words = Struct("<8Q")
+
+
+class CounterDice(Dice):
+    """Dice whose results are a pure function of a seed and a stream number.
+
+    Each block of eight 64-bit words is blake2b, keyed with the seed, of
+    the stream number and a block counter, so any stream can be started
+    directly without drawing the ones before it, in any process, with the
+    same results. set_stream() moves to the start of another stream.
+    Stream numbers must fit in 64 bits.
+    """
+
+    def __init__(self, x=None, stream=0):
+        self.stream = stream
+        super().__init__(x)
+
+    def seed(self, a=None, version=2):
+        from hashlib import blake2b  # hashlib loads OpenSSL, so only when needed
+
+        if a is None:
+            a = Random().getrandbits(128)
+        self._blake2b = blake2b
+        self._key = blake2b(str(a).encode(), digest_size=32).digest()
+        self.set_stream(self.stream)
+
+    def set_stream(self, stream):
+        """Start over at the beginning of stream number stream."""
+
+        self.stream = stream
+        self._counter = 0
+        self._words = []
+
+    def _next_word(self):
+        if not self._words:
+            digest = self._blake2b(_counter_block.pack(self.stream, self._counter),
+                                   key=self._key, digest_size=64).digest()
+            self._counter += 1
+            self._words = list(_counter_words.unpack(digest))
+        return self._words.pop()
+
+    def random(self):
+        return (self._next_word() >> 11) * (1.0 / (1 << 53))
+
+    def getrandbits(self, k):
+        if k <= 64:
+            return self._next_word() >> (64 - k)
+
+        bits = 0
+        for shift in range(0, k, 64):
+            bits |= self._next_word() << shift
+        return bits >> (-k % 64)
+
+    def getstate(self):
+        return self._key, self.stream, self._counter, tuple(self._words)
+
+    def setstate(self, state):
+        self._key, self.stream, self._counter, words = state
+        self._words = list(words)
+
+
+_mask64 = (1 << 64) - 1
+_golden_gamma = 0x9e3779b97f4a7c15
+
+
+def _mix64(value):
+    """splitmix64's finalizer, scrambling a 64-bit value."""
+
+    value = (value ^ (value >> 30)) * 0xbf58476d1ce4e5b9 & _mask64
+    value = (value ^ (value >> 27)) * 0x94d049bb133111eb & _mask64
+    return value ^ (value >> 31)
+
+
+def derive_seed(base_seed, index):
+    """Derive an independent seed for stream number index of a run.
+
+    base_seed is folded into 64 bits one word at a time, and the seed is
+    splitmix64's output number index from there. This runs on every
+    command line run, so it avoids importing hashlib.
+    """
+
+    state = 1 if base_seed < 0 else 0
+    value = abs(base_seed)
+    while True:
+        state = _mix64((state ^ value & _mask64) + _golden_gamma & _mask64)
+        value >>= 64
+        if not value:
+            break
+
+    return _mix64(state + (index + 1) * _golden_gamma & _mask64)
+
+
+# Used by the generation steps when no Dice is passed in.
+default_rng = Dice()
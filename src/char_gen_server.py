@@ -0,0 +1,303 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+#!/usr/bin/env python3
+
+"""Long-running local character service.
+
+Keeps a pool of pre-generated characters for each level and serves them
+over a Unix socket or a localhost TCP port, so callers skip interpreter
+startup and generation time on every request.
+
+Requests and responses are single lines of JSON. A request such as
+{"count": 10, "level": 5} is answered with {"characters": [...]}, where each
+character is a char_gen_output.json_record() object, or a block of text
+when the request has "format": "text". A request can ask for at most
+max_count characters. A request of {"stats": true} returns the pool hit
+rate, request latency percentiles and pool sizes.
+
+Usage: python char_gen_server.py [--socket PATH] [--port P] [--capacity C]
+                                 [--levels LIST] [--seed S] [--average-hp]
+       python char_gen_server.py --client [--socket PATH] [--port P] [-N] [-L]
+                                 [--format F] [--stats]
+
+Optional arguments:
+    --socket PATH  Listen on (or connect to) the Unix socket at PATH
+    --port P       Listen on (or connect to) TCP port P on 127.0.0.1, defaults to 8420
+    --capacity C   Characters kept ready per level, defaults to 1000
+    --levels LIST  Comma separated levels to fill at startup, defaults to 1
+    --seed S       Seed the server's dice with integer S
+    --average-hp   Use the average of the hit die for HP above level 1 instead of rolls
+    --client       Send one request to a running server and print the reply
+    -N             Request N characters, defaults to 1
+    -L             Request characters of level L, defaults to 1
+    --format F     Character format in the reply: json or text, defaults to json
+    --stats        Request the server's statistics instead of characters
+"""
+
+
+import asyncio
+import json
+import os
+import socket
+import sys
+from collections import deque
+from time import perf_counter
+
+from char_gen import generate, parse_args
+from char_gen_output import json_record, render_char
+from char_gen_rng import BufferedDice
+
+
+# Characters generated per step of the refill task, or of a request the
+# pool can't cover, before yielding to other requests.
+refill_batch = 64
+
+# Most characters a single request may ask for.
+max_count = 10000
+
+# Most recent request latencies kept for the percentiles.
+latency_samples = 10000
+
+
+class WarmPool:
+    """Per-level ring buffers of ready characters, topped up in the background.
+
+    take() serves characters from the buffer for their level and generates
+    any shortfall on the spot, refill_batch at a time so other requests
+    aren't held up. Levels are added the first time they are asked for.
+    fill() is the refill task; it runs until cancelled.
+    """
+
+    def __init__(self, capacity=1000, levels=(1,), rng=None, average_hp=False):
+        self.capacity = capacity
+        self.rng = rng if rng is not None else BufferedDice()
+        self.average_hp = average_hp
+        self.buffers = {lvl: deque(maxlen=capacity) for lvl in levels}
+        self.hits = 0
+        self.misses = 0
+        self._wanted = asyncio.Event()
+        self._wanted.set()
+
+    async def take(self, lvl, count):
+        """Return count characters of level lvl, from the pool where possible."""
+
+        buffer = self.buffers.get(lvl)
+        if buffer is None:
+            buffer = self.buffers[lvl] = deque(maxlen=self.capacity)
+
+        served = min(count, len(buffer))
+        characters = [buffer.popleft() for i in range(served)]
+        self.hits += served
+        self.misses += count - served
+        self._wanted.set()
+
+        while len(characters) < count:
+            for i in range(min(refill_batch, count - len(characters))):
+                characters.append(generate(lvl, self.rng, self.average_hp))
+            await asyncio.sleep(0)  # Let other requests through
+
+        return characters
+
+    async def fill(self):
+        """Keep every level's buffer topped up to capacity."""
+
+        while True:
+            await self._wanted.wait()
+            self._wanted.clear()
+
+            for lvl, buffer in list(self.buffers.items()):
+                while len(buffer) < self.capacity:
+                    for i in range(min(refill_batch, self.capacity - len(buffer))):
+                        buffer.append(generate(lvl, self.rng, self.average_hp))
+                    await asyncio.sleep(0)  # Let waiting requests through
+
+    def hit_rate(self):
+        """Share of requested characters served from the pool."""
+
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of samples, or 0.0 if there are none."""
+
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class CharacterServer:
+    """Answers line-delimited JSON requests from a WarmPool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.requests = 0
+        self.latencies = deque(maxlen=latency_samples)
+
+    def stats(self):
+        """Pool hit rate, latency percentiles in milliseconds and pool sizes."""
+
+        return {
+            "requests": self.requests,
+            "hits": self.pool.hits,
+            "misses": self.pool.misses,
+            "hit_rate": self.pool.hit_rate(),
+            "p50_ms": percentile(self.latencies, 0.50) * 1000,
+            "p99_ms": percentile(self.latencies, 0.99) * 1000,
+            "pool": {str(lvl): len(buffer) for lvl, buffer in self.pool.buffers.items()}
+        }
+
+    async def respond(self, request):
+        """Build the reply to one decoded request."""
+
+        if request.get("stats"):
+            return self.stats()
+
+        count = int(request.get("count", 1))
+        lvl = int(request.get("level", 1))
+        output_format = request.get("format", "json")
+        if not 0 <= count <= max_count or not 1 <= lvl <= 20:
+            raise ValueError("count must be between 0 and {0} and level between 1 and 20".format(
+                max_count))
+        if output_format not in ("json", "text"):
+            raise ValueError("Unknown format: {0}".format(output_format))
+
+        characters = await self.pool.take(lvl, count)
+        if output_format == "text":
+            return {"characters": [render_char(c) for c in characters]}
+        return {"characters": [json_record(c) for c in characters]}
+
+    async def handle(self, reader, writer):
+        """Serve requests from one connection until it closes."""
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                start = perf_counter()
+                try:
+                    reply = await self.respond(json.loads(line))
+                except (ValueError, TypeError, AttributeError, OverflowError) as error:
+                    reply = {"error": str(error)}
+
+                writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+                self.requests += 1
+                self.latencies.append(perf_counter() - start)
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(pool, socket_path=None, port=8420):
+    """Run the service on a Unix socket, or on 127.0.0.1:port, until cancelled."""
+
+    service = CharacterServer(pool)
+    refill = asyncio.ensure_future(pool.fill())
+
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(service.handle, path=socket_path)
+    else:
+        server = await asyncio.start_server(service.handle, "127.0.0.1", port)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        refill.cancel()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def request(message, socket_path=None, port=8420):
+    """Send one request to a running server and return its decoded reply."""
+
+    if socket_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socket_path)
+    else:
+        connection = socket.create_connection(("127.0.0.1", port))
+
+    with connection, connection.makefile("rb") as replies:
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        return json.loads(replies.readline())
+
+
+def main():
+    """Main() function for the service and its client."""
+
+    try:
+        counts, options = parse_args(sys.argv[1:],
+                                     flags={"client", "stats", "average-hp", "help"})
+
+        socket_path = options.pop("socket", None)
+        port = int(options.pop("port", 8420))
+
+        if options.pop("help", False):
+            print(__doc__)
+            sys.exit(0)
+
+        if options.pop("client", False):
+            message = {"stats": True} if options.pop("stats", False) else {
+                "count": counts[0] if len(counts) >= 1 else 1,
+                "level": counts[1] if len(counts) >= 2 else 1,
+                "format": options.pop("format", "json")
+            }
+        else:
+            message = None
+            capacity = int(options.pop("capacity", 1000))
+            levels = [int(lvl) for lvl in options.pop("levels", "1").split(",")]
+            seed = options.pop("seed", None)
+            average_hp = options.pop("average-hp", False)
+            if capacity < 1:
+                raise ValueError("--capacity must be at least 1")
+
+        for name in options:
+            raise ValueError("Invalid argument passed: --{0}".format(name))
+
+    except ValueError as error:
+        print(error)
+        print(__doc__)
+        sys.exit(1)
+
+    if message is not None:
+        reply = request(message, socket_path, port)
+        if message.get("format") == "text" and "characters" in reply:
+            print("".join(reply["characters"]), end="")
+        else:
+            print(json.dumps(reply, indent=2))
+        return
+
+    rng = BufferedDice(int(seed) if seed is not None else None)
+
+    async def run():
+        pool = WarmPool(capacity, levels, rng, average_hp)
+        await serve(pool, socket_path, port)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
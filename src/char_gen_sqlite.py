@@ -0,0 +1,296 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Bulk loading of generated characters into SQLite.
+
+Characters go in one row each, with races, classes, alignments, sizes,
+languages and proficiencies as lookup tables of the enums in
+char_gen_components. Proficiencies every character of a race and class
+share are linked once per race and class in base_proficiencies, and only
+each character's own picks in character_proficiencies; the
+all_proficiencies view joins the two back together.
+"""
+
+
+import sqlite3
+
+from char_gen_components import (
+    Alignment, BaseClass, Race, Size, Stat, base_proficiency_masks, class_hit_dice,
+    display_names, language_members, proficiency_members
+)
+
+
+# Stat columns of the characters table, in Stat order.
+stat_columns = tuple(stat.name.lower() for stat in Stat)
+
+_schema = """
+CREATE TABLE IF NOT EXISTS races (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS classes (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS alignments (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sizes (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS languages (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS proficiencies (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+
+CREATE TABLE IF NOT EXISTS characters (
+    id INTEGER PRIMARY KEY,
+    gender TEXT NOT NULL,
+    race_id INTEGER NOT NULL REFERENCES races (id),
+    class_id INTEGER NOT NULL REFERENCES classes (id),
+    alignment_id INTEGER NOT NULL REFERENCES alignments (id),
+    level INTEGER NOT NULL,
+    health INTEGER NOT NULL,
+    hit_die INTEGER NOT NULL,
+    speed INTEGER NOT NULL,
+    size_id INTEGER NOT NULL REFERENCES sizes (id),
+    strength INTEGER NOT NULL,
+    dexterity INTEGER NOT NULL,
+    constitution INTEGER NOT NULL,
+    intelligence INTEGER NOT NULL,
+    wisdom INTEGER NOT NULL,
+    charisma INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS character_languages (
+    character_id INTEGER NOT NULL REFERENCES characters (id),
+    language_id INTEGER NOT NULL REFERENCES languages (id),
+    PRIMARY KEY (character_id, language_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS base_proficiencies (
+    race_id INTEGER NOT NULL REFERENCES races (id),
+    class_id INTEGER NOT NULL REFERENCES classes (id),
+    proficiency_id INTEGER NOT NULL REFERENCES proficiencies (id),
+    PRIMARY KEY (race_id, class_id, proficiency_id)
+);
+
+CREATE TABLE IF NOT EXISTS character_proficiencies (
+    character_id INTEGER NOT NULL REFERENCES characters (id),
+    proficiency_id INTEGER NOT NULL REFERENCES proficiencies (id),
+    PRIMARY KEY (character_id, proficiency_id)
+) WITHOUT ROWID;
+
+CREATE VIEW IF NOT EXISTS all_proficiencies AS
+    SELECT c.id AS character_id, b.proficiency_id
+    FROM characters AS c
+    JOIN base_proficiencies AS b ON b.race_id = c.race_id AND b.class_id = c.class_id
+    UNION ALL
+    SELECT character_id, proficiency_id FROM character_proficiencies;
+"""
+
+# Created once a load is finished, as keeping them up to date row by row
+# is much slower than building them in one go, and dropped before a load
+# into an existing database for the same reason. The junction tables are
+# already ordered by character, as characters are inserted in id order.
+_index_columns = (
+    ("characters_race_class_level", "characters (race_id, class_id, level)"),
+    ("characters_alignment", "characters (alignment_id)"),
+) + tuple(
+    ("characters_{0}".format(column), "characters ({0})".format(column))
+    for column in stat_columns
+) + (
+    ("character_languages_language", "character_languages (language_id)"),
+    ("character_proficiencies_proficiency", "character_proficiencies (proficiency_id)"),
+)
+
+_indexes = "".join(
+    "CREATE INDEX IF NOT EXISTS {0} ON {1};\n".format(name, columns)
+    for name, columns in _index_columns
+)
+
+_drop_indexes = "".join(
+    "DROP INDEX IF EXISTS {0};\n".format(name) for name, columns in _index_columns
+)
+
+_insert_character = "INSERT INTO characters VALUES ({0})".format(", ".join("?" * 16))
+
+
+# Bit indexes of masks already seen by _bit_indexes(). Characters share a
+# small number of language and proficiency combinations.
+_mask_bits = {}
+_mask_bits_limit = 1 << 14
+
+
+def _bit_indexes(mask):
+    """Indexes of the bits set in mask, lowest first."""
+
+    indexes = _mask_bits.get(mask)
+    if indexes is None:
+        indexes = []
+        rest = mask
+        while rest:
+            low = rest & -rest
+            indexes.append(low.bit_length() - 1)
+            rest ^= low
+
+        indexes = tuple(indexes)
+        if len(_mask_bits) < _mask_bits_limit:
+            _mask_bits[mask] = indexes
+
+    return indexes
+
+
+class SqliteWriter:
+    """Loads characters into the SQLite database at path.
+
+    Used like the writers in char_gen_output: write_header() creates the
+    tables, write() queues a character and every batch_size characters
+    are inserted with executemany() in a single transaction. Leaving the
+    with block, or finish(), inserts what is left, builds the indexes and
+    closes the database. Leaving it with an exception only closes the
+    database: the characters still queued are dropped, and the indexes
+    are left for the next load that finishes to build. Loading into an
+    existing database appends to it, dropping its indexes until finish().
+    """
+
+    def __init__(self, path, batch_size=10000):
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self._characters = []
+        self._languages = []
+        self._proficiencies = []
+        self._next_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.finish()
+        else:
+            self.connection.close()
+
+    def write_header(self):
+        """Create the tables, drop their indexes and fill in the lookup tables."""
+
+        connection = self.connection
+        connection.executescript(_schema)
+        connection.executescript(_drop_indexes)
+
+        connection.execute("BEGIN")
+        for table, members in (("races", Race), ("classes", BaseClass),
+                               ("alignments", Alignment), ("sizes", Size),
+                               ("languages", language_members),
+                               ("proficiencies", proficiency_members)):
+            connection.executemany(
+                "INSERT OR IGNORE INTO {0} VALUES (?, ?)".format(table),
+                [(i, display_names[member]) for i, member in enumerate(members)])
+
+        connection.executemany(
+            "INSERT OR IGNORE INTO base_proficiencies VALUES (?, ?, ?)",
+            [(race.value, char_class.value, proficiency)
+             for (race, char_class), mask in base_proficiency_masks.items()
+             for proficiency in _bit_indexes(mask)])
+        connection.execute("COMMIT")
+
+        self._next_id = connection.execute(
+            "SELECT coalesce(max(id), 0) + 1 FROM characters").fetchone()[0]
+
+    def write(self, character):
+        """Queue a character, inserting the batch once it is full."""
+
+        if self._next_id is None:
+            self.write_header()
+
+        character_id = self._next_id
+        self._next_id += 1
+
+        self._characters.append((
+            character_id,
+            "Female" if character.gender else "Male",
+            character.race.value,
+            character.char_class.value,
+            character.alignment.value,
+            character.level,
+            character.health,
+            class_hit_dice[character.char_class],
+            character.speed,
+            character.size.value,
+            *character._stats
+        ))
+        self._languages += [
+            (character_id, language) for language in _bit_indexes(character._languages)
+        ]
+        # Only the character's own picks; the race and class base is linked
+        # once in base_proficiencies.
+        base = base_proficiency_masks[character.race, character.char_class]
+        self._proficiencies += [
+            (character_id, proficiency)
+            for proficiency in _bit_indexes(character._proficiencies & ~base)
+        ]
+
+        if len(self._characters) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert every queued character in one transaction."""
+
+        if not self._characters:
+            return
+
+        connection = self.connection
+        connection.execute("BEGIN")
+        connection.executemany(_insert_character, self._characters)
+        connection.executemany("INSERT INTO character_languages VALUES (?, ?)",
+                               self._languages)
+        connection.executemany("INSERT INTO character_proficiencies VALUES (?, ?)",
+                               self._proficiencies)
+        connection.execute("COMMIT")
+
+        self._characters.clear()
+        self._languages.clear()
+        self._proficiencies.clear()
+
+    def finish(self):
+        """Insert what is left, build the indexes and close the database."""
+
+        self.flush()
+        self.connection.executescript(_indexes)
+        self.connection.execute("ANALYZE")
+        self.connection.close()
+
+
+def find_characters(connection, race=None, char_class=None, level=None, min_stats=None):
+    """Rows of characters matching every limit given, as sqlite3.Row objects.
+
+    race, char_class and level must match exactly and min_stats maps a Stat
+    to the lowest score allowed. For example, every level 5 Dwarf Cleric
+    with at least 15 Wisdom:
+
+        find_characters(connection, Race.DWARF, BaseClass.CLERIC, 5,
+                        {Stat.WISDOM: 15})
+    """
+
+    conditions = []
+    parameters = []
+    for column, value in (("race_id", race), ("class_id", char_class), ("level", level)):
+        if value is not None:
+            conditions.append("{0} = ?".format(column))
+            parameters.append(getattr(value, "value", value))
+    for stat, minimum in (min_stats or {}).items():
+        conditions.append("{0} >= ?".format(stat_columns[stat.value]))
+        parameters.append(minimum)
+
+    query = "SELECT * FROM characters"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    cursor = connection.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor.execute(query + " ORDER BY id", parameters).fetchall()
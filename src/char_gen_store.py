@@ -0,0 +1,212 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Fixed-width binary store of generated characters.
+
+A store file is a 16 byte header followed by one record_size byte record
+per character, so record i is found by arithmetic alone. Files are
+written by char_gen_output.StoreWriter, which is also --format store, and
+read back by CharacterStore through mmap.
+
+The header holds the magic bytes b"D20C", the format version, the record
+size and the number of records, or 0 when the writer could not go back
+and fill it in, in which case the file size gives the count.
+"""
+
+
+import mmap
+from struct import Struct
+
+from char_gen_components import (
+    Alignment, BaseClass, Race, Size, class_hit_dice, hit_dice_names, race_traits
+)
+
+
+store_magic = b"D20C"
+store_version = 1
+
+# Magic bytes, version, record size and record count.
+store_header = Struct("<4sHHQ")
+
+# gender, race, char_class, alignment, level, hit die sides, speed and size
+# as one byte each, the six stats in Stat order, hit points, the language
+# bitmask and the little-endian proficiency bitmask.
+store_record = Struct("<8B6sHB16s")
+
+# Names of the values store_record unpacks to, in order.
+store_fields = (
+    "gender", "race", "char_class", "alignment", "level", "hit_die", "speed", "size",
+    "stats", "health", "languages", "proficiencies"
+)
+
+
+def pack_header(count=0):
+    """Header bytes for a store of count records, or of unknown size for 0."""
+
+    return store_header.pack(store_magic, store_version, store_record.size, count)
+
+
+def pack_character(character):
+    """Pack a character into one store_record."""
+
+    return store_record.pack(
+        1 if character.gender else 0,
+        character.race.value,
+        character.char_class.value,
+        character.alignment.value,
+        character.level,
+        class_hit_dice[character.char_class],
+        character.speed,
+        character.size.value,
+        bytes(character._stats),
+        character.health,
+        character._languages,
+        character.proficiencies.mask.to_bytes(16, "little")
+    )
+
+
+def unpack_character(fields):
+    """Build a Character from the values of one unpacked store_record."""
+
+    from char_gen import Character
+
+    (gender, race, char_class, alignment, level, hit_die, speed, size, stats, health,
+     languages, proficiencies) = fields
+
+    player = Character()
+    player.gender = bool(gender)
+    player.race = Race(race)
+    player.traits = race_traits[player.race]
+    player.char_class = BaseClass(char_class)
+    player.alignment = Alignment(alignment)
+    player.level = level
+    player.hit_dice = hit_dice_names[hit_die]
+    player.speed = speed
+    player.size = Size(size)
+    player._stats[:] = stats
+    player.health = health
+    player._languages = languages
+    player._proficiencies = int.from_bytes(proficiencies, "little")
+
+    return player
+
+
+def write_store(path, characters):
+    """Write characters to a new store file at path in one pass.
+
+    Returns the number of characters written, which is also filled in to
+    the header once they have all been written.
+    """
+
+    from char_gen_output import StoreWriter
+
+    count = 0
+    with open(path, "wb") as stream:
+        with StoreWriter(stream) as writer:
+            writer.write_header()
+            for character in characters:
+                writer.write(character)
+                count += 1
+
+        stream.seek(0)
+        stream.write(pack_header(count))
+
+    return count
+
+
+class CharacterStore:
+    """Read-only, memory mapped view of a store file.
+
+    record() gives the raw bytes of a record as a memoryview into the
+    mapping without copying them, fields() unpacks one record in place and
+    indexing builds a Character. records() and iteration go through the
+    whole file one record at a time, decoding each only when it is reached.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as stream:
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(self._map) < store_header.size:
+                raise ValueError("{0} is too short to be a character store".format(path))
+
+            magic, version, record_size, count = store_header.unpack_from(self._map)
+            if magic != store_magic:
+                raise ValueError("{0} is not a character store".format(path))
+            if version != store_version or record_size != store_record.size:
+                raise ValueError("Unsupported character store version {0} in {1}".format(
+                    version, path))
+
+            available = (len(self._map) - store_header.size) // record_size
+            if count > available:
+                raise ValueError("{0} is missing records".format(path))
+        except ValueError:
+            self._map.close()
+            raise
+
+        self.count = count or available
+        self._view = memoryview(self._map)[
+            store_header.size:store_header.size + self.count * record_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("character index out of range")
+        return i * store_record.size
+
+    def record(self, i):
+        """The bytes of record i, as a memoryview into the file."""
+
+        offset = self._offset(i)
+        return self._view[offset:offset + store_record.size]
+
+    def fields(self, i):
+        """The values of record i, in store_fields order."""
+
+        return store_record.unpack_from(self._view, self._offset(i))
+
+    def __getitem__(self, i):
+        """Build the Character stored in record i."""
+
+        return unpack_character(self.fields(i))
+
+    def records(self):
+        """Yield the values of every record in turn, in store_fields order."""
+
+        return store_record.iter_unpack(self._view)
+
+    def __iter__(self):
+        for fields in self.records():
+            yield unpack_character(fields)
+
+    def close(self):
+        """Release the mapping. Views handed out by record() must be released first."""
+
+        self._view.release()
+        self._map.close()
@@ -0,0 +1,52 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Chi-square helpers shared by the tests comparing two ways of generating."""
+
+
+import unittest
+from collections import Counter
+
+
+def chi_square_limit(degrees):
+    """Chi-square critical value at a significance level of 0.001.
+
+    Uses the Wilson-Hilferty approximation, which is close enough for
+    the number of degrees of freedom used here.
+    """
+
+    z = 3.090  # 0.999 quantile of the standard normal distribution
+    return degrees * (1 - 2 / (9 * degrees) + z * (2 / (9 * degrees)) ** 0.5) ** 3
+
+
+def homogeneity(first, second):
+    """Chi-square statistic and degrees of freedom for two equal size samples."""
+
+    statistic = 0.0
+    for key in set(first) | set(second):
+        a, b = first.get(key, 0), second.get(key, 0)
+        statistic += (a - b) ** 2 / (a + b)
+    return statistic, len(set(first) | set(second)) - 1
+
+
+class DistributionTestCase(unittest.TestCase):
+    """TestCase with a check that two samples come from the same distribution."""
+
+    def assertSameDistribution(self, first, second):
+        statistic, degrees = homogeneity(Counter(first), Counter(second))
+        self.assertLess(statistic, chi_square_limit(degrees))
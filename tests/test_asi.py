@@ -0,0 +1,76 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks for allocate_asi(), which spends ASI points on stats below 20.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from char_gen import allocate_asi  # noqa: E402
+from char_gen_rng import Dice  # noqa: E402
+
+
+class AllocateAsiTest(unittest.TestCase):
+
+    def test_all_stats_at_20(self):
+        scores = [20] * 6
+        self.assertEqual(allocate_asi(scores, 14, Dice(1)), 14)
+        self.assertEqual(scores, [20] * 6)
+
+    def test_runs_out_of_stats(self):
+        scores = [19, 20, 18, 20, 20, 20]
+        self.assertEqual(allocate_asi(scores, 10, Dice(2)), 7)
+        self.assertEqual(scores, [20] * 6)
+
+    def test_never_over_20(self):
+        rng = Dice(3)
+        for i in range(2000):
+            scores = [rng.randint(14, 20) for stat in range(6)]
+            before = list(scores)
+            points = rng.randint(0, 14)
+            unspent = allocate_asi(scores, points, rng)
+
+            self.assertTrue(all(score <= 20 for score in scores), (before, scores))
+            self.assertEqual(sum(scores) - sum(before) + unspent, points)
+            self.assertEqual(unspent, max(points - sum(20 - score for score in before), 0))
+
+    def test_19_gets_at_most_one_point(self):
+        rng = Dice(4)
+        for i in range(2000):
+            scores = [19, 10, 10, 10, 10, 10]
+            self.assertEqual(allocate_asi(scores, 4, rng), 0)
+            self.assertIn(scores[0], (19, 20))
+            self.assertEqual(sum(scores), 69 + 4)
+
+    def test_bytearray_scores(self):
+        # Character keeps its stats in a bytearray, which allocate_asi()
+        # changes in place.
+        scores = bytearray([20, 20, 20, 20, 20, 15])
+        self.assertEqual(allocate_asi(scores, 6, Dice(5)), 1)
+        self.assertEqual(scores, bytearray([20] * 6))
+
+
+if __name__ == "__main__":
+    unittest.main()
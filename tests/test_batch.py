@@ -0,0 +1,90 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks that the batch engine generates like generate() does.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from char_gen import chunk_characters, generate  # noqa: E402
+from char_gen_batch import generate_batch  # noqa: E402
+from char_gen_components import Stat  # noqa: E402
+from char_gen_rng import BufferedDice  # noqa: E402
+from distribution_checks import DistributionTestCase  # noqa: E402
+
+
+samples = 20000
+
+# What is compared between the two engines, by name.
+attributes = {
+    "gender": lambda player: player.gender,
+    "race": lambda player: player.race,
+    "char_class": lambda player: player.char_class,
+    "alignment": lambda player: player.alignment,
+    "health": lambda player: player.health,
+    "speed": lambda player: player.speed,
+    "languages": lambda player: player.languages.mask,
+    "proficiency count": lambda player: len(player.proficiencies),
+    **{stat.name.lower(): (lambda player, stat=stat: player.stats[stat]) for stat in Stat}
+}
+
+
+class BatchTest(DistributionTestCase):
+
+    def check_level(self, lvl, average_hp=False):
+        batch = list(generate_batch(samples, lvl, BufferedDice(1), average_hp))
+        rng = BufferedDice(2)
+        scalar = [generate(lvl, rng, average_hp) for i in range(samples)]
+
+        for name, attribute in attributes.items():
+            with self.subTest(level=lvl, attribute=name):
+                self.assertSameDistribution(map(attribute, batch), map(attribute, scalar))
+
+    def test_level_1(self):
+        self.check_level(1)
+
+    def test_level_12(self):
+        self.check_level(12)
+
+    def test_level_20_average_hp(self):
+        self.check_level(20, average_hp=True)
+
+    def test_proficiencies(self):
+        batch = generate_batch(samples, 1, BufferedDice(3))
+        rng = BufferedDice(4)
+        scalar = [generate(1, rng) for i in range(samples)]
+
+        # Every proficiency held, counted once per character holding it.
+        self.assertSameDistribution(
+            [member for player in batch for member in player.proficiencies],
+            [member for player in scalar for member in player.proficiencies])
+
+    def test_chunk_characters(self):
+        self.assertEqual(len(list(chunk_characters(300, BufferedDice(5), lvl=4))), 300)
+        self.assertEqual(len(list(chunk_characters(3, BufferedDice(5), lvl=4))), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks that minimum stats give the same characters as filtering.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from char_gen import generate  # noqa: E402
+from char_gen_components import BaseClass, Race, Stat  # noqa: E402
+from char_gen_constraints import Constraints  # noqa: E402
+from char_gen_rng import BufferedDice  # noqa: E402
+from distribution_checks import DistributionTestCase  # noqa: E402
+
+
+samples = 10000
+
+
+class CountingDice:
+    """Passes every call through to a BufferedDice, counting them."""
+
+    def __init__(self, seed):
+        self.dice = BufferedDice(seed)
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.dice, name)
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return method(*args, **kwargs)
+
+        return counted
+
+
+class CountingConstraints(Constraints):
+    """Constraints counting the attempts generate() makes, one stats() call each."""
+
+    attempts = 0
+
+    def stats(self, player, lvl, rng):
+        self.attempts += 1
+        super().stats(player, lvl, rng)
+
+
+def constrained_and_filtered(lvl, min_stats, races=None, classes=None):
+    """samples characters generated with min_stats, and as many kept by filtering."""
+
+    constrained = Constraints(races, classes, min_stats=min_stats)
+    rng = BufferedDice(19)
+    generated = [generate(lvl, rng, constraints=constrained) for i in range(samples)]
+
+    unconstrained = Constraints(races, classes)
+    rng = BufferedDice(20)
+    filtered = []
+    while len(filtered) < samples:
+        player = generate(lvl, rng, constraints=unconstrained)
+        if all(player.stats[stat] >= score for stat, score in min_stats.items()):
+            filtered.append(player)
+
+    return generated, filtered
+
+
+class MinimumStatsTest(DistributionTestCase):
+
+    def test_minimums_are_met(self):
+        min_stats = {Stat.INTELLIGENCE: 19, Stat.WISDOM: 12}
+        rng = BufferedDice(2019)
+        constraints = Constraints([Race.ELF], min_stats=min_stats)
+        for i in range(1000):
+            player = generate(8, rng, constraints=constraints)
+            self.assertGreaterEqual(player.stats[Stat.INTELLIGENCE], 19)
+            self.assertGreaterEqual(player.stats[Stat.WISDOM], 12)
+
+    def test_asi_points_count(self):
+        generated, filtered = constrained_and_filtered(
+            5, {Stat.INTELLIGENCE: 16}, [Race.ELF], [BaseClass.WIZARD])
+        self.assertSameDistribution([p.stats[Stat.INTELLIGENCE] for p in generated],
+                                    [p.stats[Stat.INTELLIGENCE] for p in filtered])
+
+    def test_random_racial_bonuses_count(self):
+        generated, filtered = constrained_and_filtered(1, {Stat.INTELLIGENCE: 16})
+        self.assertSameDistribution([p.race for p in generated], [p.race for p in filtered])
+        self.assertSameDistribution([p.stats[Stat.INTELLIGENCE] for p in generated],
+                                    [p.stats[Stat.INTELLIGENCE] for p in filtered])
+
+    def test_classes_are_weighted(self):
+        generated, filtered = constrained_and_filtered(
+            12, {Stat.STRENGTH: 18, Stat.CONSTITUTION: 16}, [Race.HUMAN])
+        self.assertSameDistribution([p.char_class for p in generated],
+                                    [p.char_class for p in filtered])
+
+    def test_two_stats_at_level_20_take_one_attempt(self):
+        min_stats = {Stat.INTELLIGENCE: 20, Stat.WISDOM: 20}
+        constraints = CountingConstraints(min_stats=min_stats)
+        constrained = CountingDice(2024)
+        unconstrained = CountingDice(2024)
+        for i in range(2000):
+            player = generate(20, constrained, constraints=constraints)
+            self.assertEqual(player.stats[Stat.INTELLIGENCE], 20)
+            self.assertEqual(player.stats[Stat.WISDOM], 20)
+            generate(20, unconstrained)
+
+        # Filtering takes over a hundred unconstrained characters for each one.
+        self.assertEqual(constraints.attempts, 2000)
+        self.assertLess(constrained.calls, 3 * unconstrained.calls)
+
+    def test_unreachable_minimums(self):
+        constraints = Constraints([Race.ELF], min_stats={Stat.INTELLIGENCE: 20})
+        with self.assertRaises(ValueError):
+            constraints.prepare(1)
+        constraints.prepare(4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks that levelling a character up matches generating it at the new level.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from char_gen import generate, generate_levels, level_up  # noqa: E402
+from char_gen_components import Language, Stat, ToolProficiencies  # noqa: E402
+from char_gen_rng import BufferedDice  # noqa: E402
+from distribution_checks import DistributionTestCase  # noqa: E402
+
+
+samples = 5000
+
+
+class LevelUpTest(DistributionTestCase):
+
+    def test_levels_match_generate(self):
+        rng = BufferedDice(22)
+        levelled = [generate_levels(1, 20, rng)[-1] for i in range(samples)]
+        rng = BufferedDice(23)
+        generated = [generate(20, rng) for i in range(samples)]
+
+        for stat in Stat:
+            with self.subTest(stat=stat.name):
+                self.assertSameDistribution([p.stats[stat] for p in levelled],
+                                            [p.stats[stat] for p in generated])
+        # Hit points spread over a few hundred values, so compare them in bands.
+        self.assertSameDistribution([p.health // 20 for p in levelled],
+                                    [p.health // 20 for p in generated])
+
+    def test_levels_are_separate_copies(self):
+        levels = generate_levels(1, 2, BufferedDice(22))
+        first, second = levels
+        self.assertIsNot(first._stats, second._stats)
+
+        before = (bytes(first._stats), first._languages, first._proficiencies, first.level)
+        second.stats[Stat.STRENGTH] = 1
+        second.languages.add(next(member for member in Language
+                                  if member not in second.languages))
+        second.proficiencies.add(next(member for member in ToolProficiencies
+                                      if member not in second.proficiencies))
+        after = (bytes(first._stats), first._languages, first._proficiencies, first.level)
+        self.assertEqual(before, after)
+        self.assertNotEqual(second._languages, first._languages)
+        self.assertNotEqual(second._proficiencies, first._proficiencies)
+        self.assertEqual(second.level, 2)
+
+    def test_levelling_down(self):
+        player = generate(5, BufferedDice(22))
+        with self.assertRaises(ValueError):
+            level_up(player, 4)
+        self.assertEqual(player.level, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
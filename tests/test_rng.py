@@ -0,0 +1,70 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks that sampled ability scores follow 4d6 drop lowest.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sys
+import unittest
+from collections import Counter
+from itertools import product
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from char_gen_rng import BufferedDice, CounterDice, Dice, ability_score_weights  # noqa: E402
+
+
+# Chi-square critical value for 15 degrees of freedom (16 possible scores)
+# at a significance level of 0.001.
+chi_square_limit = 37.697
+
+samples = 200000
+
+
+def chi_square(counts, weights):
+    """Pearson's chi-square statistic of counts against expected weights."""
+
+    total = sum(counts.values())
+    weight_total = sum(weights.values())
+    statistic = 0.0
+    for outcome, weight in weights.items():
+        expected = total * weight / weight_total
+        statistic += (counts.get(outcome, 0) - expected) ** 2 / expected
+    return statistic
+
+
+class AbilityScoreTest(unittest.TestCase):
+
+    def test_weights_match_enumeration(self):
+        counts = Counter(sum(roll) - min(roll) for roll in product(range(1, 7), repeat=4))
+        self.assertEqual(ability_score_weights, dict(counts))
+
+    def test_samples_match_weights(self):
+        for dice in (Dice(2019), BufferedDice(2019), CounterDice(2019)):
+            with self.subTest(dice=type(dice).__name__):
+                counts = Counter(dice.ability_scores(samples))
+                self.assertLessEqual(set(counts), set(ability_score_weights))
+                self.assertLess(chi_square(counts, ability_score_weights), chi_square_limit)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks that SQLite loads only index and analyze what finishes loading.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from char_gen import generate  # noqa: E402
+from char_gen_rng import BufferedDice  # noqa: E402
+from char_gen_sqlite import SqliteWriter  # noqa: E402
+
+
+# Indexes finish() builds: race, class and level, alignment, the six stats,
+# languages and proficiencies.
+index_count = 10
+
+
+class SqliteWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "roster.db")
+        self.rng = BufferedDice(24)
+
+    def query(self, sql, connection=None):
+        if connection is not None:
+            return connection.execute(sql).fetchall()
+
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def index_names(self, connection=None):
+        return [name for name, in self.query(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL",
+            connection)]
+
+    def analyzed(self):
+        return bool(self.query(
+            "SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'"))
+
+    def load(self, count, batch_size=10):
+        with SqliteWriter(self.path, batch_size) as writer:
+            writer.write_header()
+            for i in range(count):
+                writer.write(generate(5, self.rng))
+
+    def test_failed_load(self):
+        with self.assertRaises(RuntimeError):
+            with SqliteWriter(self.path, batch_size=10) as writer:
+                writer.write_header()
+                for i in range(25):
+                    writer.write(generate(5, self.rng))
+                raise RuntimeError("load interrupted")
+
+        # The two full batches went in; the five queued characters didn't.
+        self.assertEqual(self.query("SELECT count(*) FROM characters"), [(20,)])
+        self.assertEqual(self.index_names(), [])
+        self.assertFalse(self.analyzed())
+
+    def test_append_rebuilds_indexes(self):
+        self.load(25)
+        self.assertEqual(len(self.index_names()), index_count)
+        self.assertTrue(self.analyzed())
+
+        writer = SqliteWriter(self.path, batch_size=10)
+        writer.write_header()
+        self.assertEqual(self.index_names(writer.connection), [])
+        for i in range(15):
+            writer.write(generate(5, self.rng))
+        writer.finish()
+
+        self.assertEqual(len(self.index_names()), index_count)
+        self.assertEqual(self.query("SELECT count(*), min(id), max(id) FROM characters"),
+                         [(40, 1, 40)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks the imports done when the command line starts.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from bench_char_gen import SRC_DIR, _import_time, bench_startup  # noqa: E402
+
+
+# Most milliseconds of imports a one character run may add, as with the
+# benchmark's default --import-budget.
+import_budget = 20.0
+
+# Modules too slow to load on every run.
+heavy_modules = ("hashlib", "_hashlib", "json", "multiprocessing", "sqlite3", "asyncio")
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_import_budget(self):
+        results, version_modules = bench_startup(3)
+        self.assertLessEqual(results["startup.imports_n_1"] * 1000, import_budget)
+
+    def test_version_imports_no_generator(self):
+        results, version_modules = bench_startup(1)
+        self.assertEqual([name for name in version_modules if name.startswith("char_gen_")],
+                         [])
+
+    def test_no_heavy_imports(self):
+        seconds, modules = _import_time([os.path.join(SRC_DIR, "char_gen.py"), "-1"])
+        self.assertEqual([name for name in heavy_modules if name in modules], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# Standard Fantasy Character Generator Copyright (C) 2019-2024 Quinn Luetzow
+# This file is part of Standard Fantasy Character Generator.
+
+# Standard Fantasy Character Generator is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General
+# Public License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+
+# Standard Fantasy Character Generator is distributed in the hope that
+# it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Standard Fantasy Character Generator.  If not, see
+# <https://www.gnu.org/licenses/>.
+
+
+"""Checks that character stores read back what was written to them.
+
+Run with python -m unittest discover tests from the top of the repository.
+"""
+
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from char_gen import generate  # noqa: E402
+from char_gen_output import writers  # noqa: E402
+from char_gen_rng import BufferedDice  # noqa: E402
+from char_gen_store import (  # noqa: E402
+    CharacterStore, pack_character, store_header, store_magic, store_record, store_version,
+    write_store
+)
+
+
+count = 50
+
+
+class CharacterStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "roster.d20")
+
+        rng = BufferedDice(23)
+        self.characters = [generate(lvl % 20 + 1, rng) for lvl in range(count)]
+        self.records = [pack_character(character) for character in self.characters]
+
+    def write_bytes(self, data):
+        with open(self.path, "wb") as stream:
+            stream.write(data)
+
+    def header_count(self):
+        with open(self.path, "rb") as stream:
+            return store_header.unpack(stream.read(store_header.size))[3]
+
+    def test_write_store_round_trip(self):
+        self.assertEqual(write_store(self.path, self.characters), count)
+        self.assertEqual(self.header_count(), count)
+
+        with CharacterStore(self.path) as store:
+            self.assertEqual(len(store), count)
+            for i in (0, 1, count - 1):
+                self.assertEqual(pack_character(store[i]), self.records[i])
+            self.assertEqual(pack_character(store[-1]), self.records[-1])
+            self.assertEqual(pack_character(store[-count]), self.records[0])
+            with store.record(3) as record:
+                self.assertEqual(bytes(record), self.records[3])
+
+            self.assertEqual([pack_character(character) for character in store], self.records)
+            self.assertEqual([store_record.pack(*fields) for fields in store.records()],
+                             self.records)
+
+            for i in (count, -count - 1):
+                with self.assertRaises(IndexError):
+                    store[i]
+
+    def test_format_store_output(self):
+        with open(self.path, "wb") as stream:
+            with writers["store"](stream) as writer:
+                writer.write_header()
+                for character in self.characters:
+                    writer.write(character)
+
+        # The writer can't go back to fill in the count, so it comes from the file size.
+        self.assertEqual(self.header_count(), 0)
+        with CharacterStore(self.path) as store:
+            self.assertEqual(len(store), count)
+            self.assertEqual([pack_character(character) for character in store], self.records)
+
+    def test_bad_magic(self):
+        self.write_bytes(store_header.pack(b"D20X", store_version, store_record.size, 0))
+        with self.assertRaisesRegex(ValueError, "not a character store"):
+            CharacterStore(self.path)
+
+    def test_bad_version(self):
+        self.write_bytes(store_header.pack(store_magic, store_version + 1, store_record.size, 0))
+        with self.assertRaisesRegex(ValueError, "Unsupported character store version"):
+            CharacterStore(self.path)
+
+        self.write_bytes(store_header.pack(store_magic, store_version, store_record.size + 1, 0))
+        with self.assertRaisesRegex(ValueError, "Unsupported character store version"):
+            CharacterStore(self.path)
+
+    def test_truncated_files(self):
+        self.write_bytes(store_magic)
+        with self.assertRaisesRegex(ValueError, "too short"):
+            CharacterStore(self.path)
+
+        write_store(self.path, self.characters)
+        with open(self.path, "r+b") as stream:
+            stream.truncate(store_header.size + 10 * store_record.size + 5)
+        with self.assertRaisesRegex(ValueError, "missing records"):
+            CharacterStore(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()